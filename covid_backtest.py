@@ -0,0 +1,110 @@
+import numpy as np
+
+import covid_feature_extraction
+from covid_model_selection import var_forecast
+
+ALLOCATION_VAR_COLUMNS = ["Cases per 100k", "Deaths per 100k", "vaccine_allocations"]
+
+
+def autoregression_data(target_label, county_name=None):
+    '''
+    Assemble the series used by the autoregression notebooks: the travel
+    target, the cases and deaths per 100k residents, and the doses allocated
+    to Georgia, aligned by date with no allocations before December 2020;
+    a day missing from the epicurve has NaN cases and deaths.
+
+    Parameters
+    ----------
+    - target_label : string specifying either the Population, Long, Medium, or
+        Short target as in county_extraction
+    - county_name : string county name, or None for the state of Georgia
+    Returns
+    -------
+    - vector_data : DataFrame indexed by date with the columns target_label,
+        "Cases per 100k", "Deaths per 100k" and "vaccine_allocations"
+    '''
+    region = "Georgia" if county_name is None else county_name
+    data = covid_feature_extraction.region_data(region, target_label)
+    return data[[target_label] + ALLOCATION_VAR_COLUMNS]
+
+
+def walk_forward_backtest(vector_data, lag, min_train, horizon=14, target=0):
+    '''
+    Rolling-origin evaluation of a VAR(lag) with a constant on the
+    differenced series. The origin advances one day at a time; instead of
+    refitting, the least-squares fit is updated with the single new row by
+    recursive least squares, so every origin costs O((1 + lag*K)^2). At each
+    origin the differences are forecast horizon days ahead and integrated
+    from the last observed level, as in VAR_wrapper.
+
+    Parameters
+    ----------
+    - vector_data : array or DataFrame of shape (time, K) holding the series
+        in levels
+    - lag : VAR lag order
+    - min_train : number of days in the first training window
+    - horizon : number of days forecast from every origin
+    - target : column (position or name) whose errors are reported
+    Returns
+    -------
+    - horizons : the forecast horizons 1..horizon in days
+    - mse_by_horizon : mean squared error of the target at each horizon,
+        averaged over the origins that have data that far ahead
+    - errors : array of shape (origins, horizon) with the forecast minus
+        the observed target, NaN past the end of the data
+    - origins : number of training days at each origin
+    '''
+    if hasattr(vector_data, "columns"):
+        if not isinstance(target, (int, np.integer)):
+            target = list(vector_data.columns).index(target)
+        vector_data = vector_data.to_numpy()
+    levels = np.asarray(vector_data, dtype=float)
+    diff = np.diff(levels, axis=0)
+    K = diff.shape[1]
+    if min_train - 1 <= lag + lag*K + 1:
+        raise ValueError("min_train={} is too short to fit a VAR({})".format(min_train, lag))
+
+    # row t of the design is [1, d_{t-1}, ..., d_{t-lag}] for t >= lag
+    design = np.ones((len(diff), 1 + lag*K))
+    for j in range(1, lag + 1):
+        design[lag:, 1 + K*(j - 1):1 + K*j] = diff[lag - j:len(diff) - j]
+
+    # fit on the first window, then one recursive update per day. Columns
+    # that are still all zero, e.g. lagged allocations before the first
+    # delivery, are left out with a zero coefficient, which is the
+    # minimum-norm least-squares fit; the first row that reaches one of them
+    # triggers an exact refit with it included.
+    n_fit = min_train - 1
+    active = np.any(design[lag:n_fit] != 0, axis=0)
+    precision, coefs = _least_squares(design[lag:n_fit], diff[lag:n_fit], active)
+
+    origins = np.arange(min_train, len(levels))
+    errors = np.full((len(origins), horizon), np.nan)
+    for i, origin in enumerate(origins):
+        if origin > min_train:
+            t = origin - 2
+            z = design[t]
+            if np.any(z[~active] != 0):
+                active |= z != 0
+                precision, coefs = _least_squares(design[lag:t + 1], diff[lag:t + 1], active)
+            else:
+                z = z[active]
+                gain = precision @ z
+                gain /= 1 + z @ gain
+                coefs[active] += np.outer(gain, diff[t] - z @ coefs[active])
+                precision -= np.outer(gain, z @ precision)
+        forecast = var_forecast(coefs, diff[origin - 1 - lag:origin - 1], horizon)
+        level_forecast = levels[origin - 1, target] + np.cumsum(forecast[:, target])
+        observed = levels[origin:origin + horizon, target]
+        errors[i, :len(observed)] = level_forecast[:len(observed)] - observed
+
+    mse_by_horizon = np.nanmean(errors**2, axis=0)
+    return np.arange(1, horizon + 1), mse_by_horizon, errors, origins
+
+
+def _least_squares(Z, Y, active):
+    # exact fit on the active columns, the rest of the coefficients are zero
+    precision = np.linalg.inv(Z[:, active].T @ Z[:, active])
+    coefs = np.zeros((Z.shape[1], Y.shape[1]))
+    coefs[active] = precision @ (Z[:, active].T @ Y)
+    return precision, coefs
@@ -0,0 +1,398 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import traceback
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+import covid_data_loader
+from covid_data_loader import (read_source, read_trips, trip_index, TRIPS_FILE, EPICURVE_FILE,
+                               PFIZER_FILE, MODERNA_FILE, JANSSEN_FILE, TRIP_BINS)
+from covid_feature_extraction import (county_extraction, state_extraction, county_panel, region_data,
+                                      vaccine_allocations, allocation_panel, first_dose, second_dose,
+                                      cumul_doses, ALLOCATION_FILES, STATE_CODES)
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SCALES = {"state": {"n_states": 1, "counties_per_state": 159,
+                    "start_date": "2020-01-01", "end_date": "2021-05-10"},
+          "region": {"n_states": 10, "counties_per_state": 100,
+                     "start_date": "2020-01-01", "end_date": "2021-05-10"},
+          "national": {"n_states": 51, "counties_per_state": 62,
+                       "start_date": "2019-01-01", "end_date": "2021-12-31"}}
+GENERATION_FILE = "generation.json"
+GEORGIA_COUNTIES = ["Fulton", "Lowndes", "Chatham", "Cobb", "DeKalb", "Gwinnett"]
+OTHER_JURISDICTIONS = ["Chicago", "New York City", "Philadelphia", "Puerto Rico", "Guam"]
+
+
+def generate_sources(data_dir, n_states=1, counties_per_state=159, start_date="2020-01-01",
+                     end_date="2021-05-10", seed=0):
+    '''
+    Write synthetic versions of every data source into data_dir, with the
+    columns and value formats of the real files: Trips_by_Distance.csv for
+    n_states states (Georgia first) of counties_per_state counties each, the
+    Georgia epicurve_rpt_date.csv, and the Pfizer, Moderna and Janssen
+    allocation files. Georgia's first counties are the ones the notebooks
+    study, e.g. Fulton, so every extraction function runs on the output.
+    The arguments are written to GENERATION_FILE next to the csv files.
+
+    Parameters
+    ----------
+    - data_dir : directory the csv files are written to
+    - n_states : number of states, at most the 51 in STATE_CODES
+    - counties_per_state : number of counties in every state
+    - start_date, end_date : inclusive range of the daily trips and case rows
+    - seed : seed of the random values
+    Returns
+    -------
+    - rows : dict mapping each file name to its number of data rows
+    '''
+    os.makedirs(data_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start_date, end_date)
+    state_names = ["Georgia"] + [name for name in STATE_CODES if name != "Georgia"][:n_states - 1]
+    georgia_counties = (GEORGIA_COUNTIES + ["Georgia {:03d}".format(i) for i in range(len(GEORGIA_COUNTIES) + 1, counties_per_state + 1)])[:counties_per_state]
+
+    rows = {TRIPS_FILE: 0}
+    trips_path = os.path.join(data_dir, TRIPS_FILE)
+    # one state at a time, so memory stays bounded at national scale
+    for s, state_name in enumerate(state_names):
+        if state_name == "Georgia":
+            county_names = georgia_counties
+        else:
+            county_names = ["{} {:03d}".format(state_name, i) for i in range(1, counties_per_state + 1)]
+        trips = _trip_rows(rng, dates, s + 1, STATE_CODES[state_name], county_names)
+        trips.to_csv(trips_path, mode="w" if s == 0 else "a", header=s == 0, index=False)
+        rows[TRIPS_FILE] += len(trips)
+
+    epicurve = _epicurve_rows(rng, dates[dates >= "2020-02-01"], ["Georgia"] + georgia_counties)
+    epicurve.to_csv(os.path.join(data_dir, EPICURVE_FILE), index=False)
+    rows[EPICURVE_FILE] = len(epicurve)
+
+    for file_name, first_week, second_doses in [(PFIZER_FILE, "2020-12-14", True),
+                                                (MODERNA_FILE, "2020-12-21", True),
+                                                (JANSSEN_FILE, "2021-03-01", False)]:
+        allocations = _allocation_rows(rng, pd.date_range(first_week, end_date, freq="7D"),
+                                       state_names + OTHER_JURISDICTIONS, second_doses)
+        allocations.to_csv(os.path.join(data_dir, file_name), index=False)
+        rows[file_name] = len(allocations)
+
+    with open(os.path.join(data_dir, GENERATION_FILE), "w") as generation_file:
+        json.dump({"n_states": n_states, "counties_per_state": counties_per_state, "start_date": start_date,
+                   "end_date": end_date, "seed": seed}, generation_file, indent=1)
+    return rows
+
+
+def generation_parameters(data_dir):
+    '''
+    Return the generate_sources arguments the sources in data_dir were
+    written with, or None if data_dir holds no generated sources.
+    '''
+    path = os.path.join(data_dir, GENERATION_FILE)
+    if not os.path.exists(os.path.join(data_dir, TRIPS_FILE)) or not os.path.exists(path):
+        return None
+    with open(path) as generation_file:
+        return json.load(generation_file)
+
+
+def run_benchmark(data_dir=None, county_name="Fulton", target_label="Short", output=None, trace_memory=True,
+                  scale=None):
+    '''
+    Time and memory-profile the public functions of covid_data_loader and
+    covid_feature_extraction on the sources in data_dir. While a function
+    runs, covid_data_loader.STAGE_TIMER records the stages the function
+    itself marks: csv parse, cache write and load, index build and load,
+    masking, date conversion, target computation, feature computation,
+    allocation join, and concat. Time in a nested stage, e.g. an index
+    build inside masking, is only counted once, in the innermost stage. The
+    column and index stores of data_dir are cleared first, so the first
+    calls measure a cold start, while the experiment results cached next to
+    them are kept; each extraction function is then called twice, the
+    second time with every cache warm. Where os.fork is available every
+    call is measured in a forked child, so its peak RSS is its own rather
+    than the highest the benchmark has reached so far.
+
+    Parameters
+    ----------
+    - data_dir : directory of the sources, by default DATA_DIR
+    - county_name : Georgia county used by the county-level functions
+    - target_label : target used by the functions that take one
+    - output : path of a json file the report is written to, if given
+    - trace_memory : also record the peak memory allocated within each stage
+        with tracemalloc, which slows the stages down
+    - scale : name of the SCALES entry the sources were generated at, if any
+    Returns
+    -------
+    - report : dict with the environment, the scale and generate_sources
+        arguments of the sources, the number of rows of every source, and
+        one entry per (function, call, stage) holding its seconds, number
+        of entries, the rows the call returned, rows per second, peak
+        allocated bytes, and the RSS at the start of the call and at its
+        peak; the "total" stage covers the whole call and "other" the time
+        outside every marked stage
+    '''
+    report = {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+              "platform": platform.platform(), "scale": scale,
+              "generation": generation_parameters(data_dir if data_dir is not None else covid_data_loader.DATA_DIR),
+              "rows": {}, "stages": []}
+    with _data_directory(data_dir):
+        covid_data_loader.clear_cache(on_disk=True)
+
+        def measure(function_name, call, run, rows=len):
+            return _measure(report["stages"], function_name, call, run, rows, trace_memory)
+
+        for file_name in [TRIPS_FILE, EPICURVE_FILE] + ALLOCATION_FILES:
+            report["rows"][file_name] = len(measure("read_source", "cold " + file_name, lambda: read_source(file_name)))
+        covid_data_loader.clear_cache()
+        for file_name in [TRIPS_FILE, EPICURVE_FILE] + ALLOCATION_FILES:
+            measure("read_source", "cached " + file_name, lambda: read_source(file_name))
+        covid_data_loader.clear_cache()
+        measure("trip_index", "cold", trip_index, lambda index: len(index.keys))
+        covid_data_loader.clear_cache()
+        measure("trip_index", "cached", trip_index, lambda index: len(index.keys))
+        measure("read_trips", "streaming", lambda: read_trips("GA", county_name + " County", streaming=True))
+
+        # panels count (region, date) cells
+        cells = lambda panel: panel.shape[0]*panel.shape[1]
+        for function_name, run, rows in [
+                ("county_extraction", lambda: county_extraction(county_name, target_label)[1], len),
+                ("state_extraction", lambda: state_extraction(target_label)[1], len),
+                ("county_panel", lambda: county_panel()[2], cells),
+                ("region_data", lambda: region_data(county_name, target_label), len),
+                ("vaccine_allocations", lambda: vaccine_allocations("Georgia", "GA", target_label)[2], len),
+                ("first_dose", lambda: first_dose("Georgia", "GA", target_label)[2], len),
+                ("second_dose", lambda: second_dose("Georgia", "GA", target_label)[2], len),
+                ("cumul_doses", lambda: cumul_doses("Georgia", "GA", target_label)[2], len),
+                ("allocation_panel", lambda: allocation_panel()[4], cells)]:
+            covid_data_loader.clear_cache()
+            measure(function_name, "first", run, rows)
+            measure(function_name, "repeat", run, rows)
+        covid_data_loader.clear_cache()
+
+    if output is not None:
+        if os.path.dirname(output):
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, "w") as report_file:
+            json.dump(report, report_file, indent=1)
+    return report
+
+
+@contextmanager
+def _data_directory(data_dir):
+    # point the loader at another data directory and its own cache
+    if data_dir is None:
+        yield
+        return
+    saved = covid_data_loader.DATA_DIR, covid_data_loader.CACHE_DIR
+    covid_data_loader.clear_cache()
+    covid_data_loader.DATA_DIR = data_dir
+    covid_data_loader.CACHE_DIR = os.path.join(data_dir, ".cache")
+    try:
+        yield
+    finally:
+        covid_data_loader.clear_cache()
+        covid_data_loader.DATA_DIR, covid_data_loader.CACHE_DIR = saved
+
+
+def _measure(stages, function_name, call, run, rows, trace_memory):
+    # the call is measured in a forked child, so its peak RSS is its own
+    # rather than the highest the benchmark has reached so far; the parent
+    # then runs it again, unmeasured, so the caches it warms carry over
+    if hasattr(os, "fork") and resource is not None:
+        recorded, n_rows, rss = _record_in_child(run, rows, trace_memory)
+        value = run()
+    else:
+        recorded, n_rows, value = _record(run, rows, trace_memory)
+        rss = (None, None)
+    for stage_name, record in recorded.items():
+        stages.append({"function": function_name, "call": call, "stage": stage_name,
+                       "seconds": record["seconds"], "calls": record["calls"], "rows": n_rows,
+                       "rows_per_second": n_rows/record["seconds"] if record["seconds"] > 0 else None,
+                       "peak_alloc_bytes": record["peak_alloc_bytes"],
+                       "start_rss_bytes": rss[0], "peak_rss_bytes": rss[1]})
+    return value
+
+
+def _record(run, rows, trace_memory):
+    recorded = {}
+    timer, root = _stage_timer(recorded, trace_memory)
+    covid_data_loader.STAGE_TIMER = timer
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        value = run()
+    finally:
+        seconds = time.perf_counter() - start
+        if trace_memory:
+            root["peak"] = max(root["peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        covid_data_loader.STAGE_TIMER = None
+
+    recorded["other"] = {"seconds": seconds - root["nested"], "calls": 1, "peak_alloc_bytes": None}
+    recorded["total"] = {"seconds": seconds, "calls": 1, "peak_alloc_bytes": root["peak"] if trace_memory else None}
+    return recorded, int(rows(value)), value
+
+
+def _record_in_child(run, rows, trace_memory):
+    # a forked child starts from the parent's current RSS, not its peak
+    read_end, write_end = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        try:
+            start_rss = _max_rss(resource.getrusage(resource.RUSAGE_SELF))
+            recorded, n_rows, _ = _record(run, rows, trace_memory)
+            with os.fdopen(write_end, "w") as pipe:
+                json.dump({"recorded": recorded, "rows": n_rows, "start_rss": start_rss}, pipe)
+        except BaseException:
+            traceback.print_exc()
+            os._exit(1)
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        payload = pipe.read()
+    _, status, usage = os.wait4(pid, 0)
+    if status != 0:
+        raise RuntimeError("the measured call failed in its child process")
+    result = json.loads(payload)
+    return result["recorded"], result["rows"], (result["start_rss"], _max_rss(usage))
+
+
+def _stage_timer(recorded, trace_memory):
+    # a STAGE_TIMER adding up the seconds, entries and peak allocation of
+    # every stage name; a nested stage's time is taken out of the enclosing
+    # one, and the root entry stands for the whole call
+    root = {"nested": 0.0, "peak": 0, "base": 0}
+    open_stages = [root]
+
+    def note_peak(entry):
+        if trace_memory:
+            entry["peak"] = max(entry["peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+    @contextmanager
+    def timer(name):
+        note_peak(open_stages[-1])
+        current = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+        entry = {"nested": 0.0, "peak": current, "base": current}
+        open_stages.append(entry)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            note_peak(entry)
+            open_stages.pop()
+            parent = open_stages[-1]
+            parent["nested"] += elapsed
+            parent["peak"] = max(parent["peak"], entry["peak"])
+            record = recorded.setdefault(name, {"seconds": 0.0, "calls": 0, "peak_alloc_bytes": None})
+            record["seconds"] += elapsed - entry["nested"]
+            record["calls"] += 1
+            if trace_memory:
+                record["peak_alloc_bytes"] = max(record["peak_alloc_bytes"] or 0, entry["peak"] - entry["base"])
+
+    return timer, root
+
+
+def _max_rss(usage):
+    # kilobytes on Linux, bytes on macOS
+    return usage.ru_maxrss if sys.platform == "darwin" else 1024*usage.ru_maxrss
+
+
+def _trip_rows(rng, dates, state_fips, state_code, county_names):
+    # the state row (no county) followed by every county, for every date
+    n_groups = len(county_names) + 1
+    n_days = len(dates)
+    populations = rng.integers(1000, 1000000, size=n_groups)
+    populations[0] = populations[1:].sum()
+    staying = np.repeat(populations, n_days)*rng.uniform(0.15, 0.35, size=n_groups*n_days)
+    staying = staying.astype(np.int64)
+    not_staying = np.repeat(populations, n_days) - staying
+    bins = rng.integers(0, 10000, size=(n_groups*n_days, len(TRIP_BINS)))
+    bins *= np.repeat(populations, n_days)[:, None]//1000 + 1
+
+    county_fips = np.concatenate([[np.nan], state_fips*1000 + 2*np.arange(1, n_groups) - 1])
+    county_labels = np.array([np.nan] + [name + " County" for name in county_names], dtype=object)
+    day_labels = dates.strftime("%Y/%m/%d")
+    trips = pd.DataFrame({
+        "Level": np.repeat(np.array(["State"] + ["County"]*(n_groups - 1), dtype=object), n_days),
+        "Date": np.tile(day_labels, n_groups),
+        "State FIPS": state_fips,
+        "State Postal Code": state_code,
+        "County FIPS": np.repeat(county_fips, n_days),
+        "County Name": np.repeat(county_labels, n_days),
+        "Population Staying at Home": staying,
+        "Population Not Staying at Home": not_staying,
+        "Number of Trips": bins.sum(axis=1)})
+    for k, label in enumerate(TRIP_BINS):
+        trips[label] = bins[:, k]
+    group_ids = np.repeat(np.concatenate([[state_fips], county_fips[1:].astype(np.int64)]), n_days).astype(str)
+    trips["Row ID"] = pd.Series(np.tile(dates.strftime("%Y%m%d"), n_groups)) + "-" + group_ids
+    trips["Week"] = np.tile(dates.isocalendar().week.to_numpy() - 1, n_groups)
+    trips["Month"] = np.tile(dates.month, n_groups)
+    return trips
+
+
+def _epicurve_rows(rng, dates, regions):
+    n_days = len(dates)
+    cases = rng.poisson(rng.uniform(5, 500, size=(len(regions), 1)), size=(len(regions), n_days))
+    deaths = rng.binomial(cases, 0.015)
+    cases[0] = cases[1:].sum(axis=0)
+    deaths[0] = deaths[1:].sum(axis=0)
+
+    def trailing_mean(values):
+        sums = np.cumsum(np.pad(values, ((0, 0), (1, 0))), axis=1)
+        counts = np.minimum(np.arange(1, n_days + 1), 7)
+        starts = np.arange(n_days) + 1 - counts
+        return (sums[:, 1:] - sums[:, starts])/counts
+
+    return pd.DataFrame({
+        "measure": "county_stats",
+        "county": np.repeat(regions, n_days),
+        "report_date": np.tile(dates.strftime("%Y-%m-%d"), len(regions)),
+        "cases": cases.ravel(),
+        "total_cases": cases.ravel(),
+        "total_cases_cum": np.cumsum(cases, axis=1).ravel(),
+        "moving_avg_total_cases": trailing_mean(cases).ravel(),
+        "deaths": deaths.ravel(),
+        "death_cum": np.cumsum(deaths, axis=1).ravel(),
+        "moving_avg_deaths": trailing_mean(deaths).ravel()})
+
+
+def _allocation_rows(rng, weeks, jurisdictions, second_doses):
+    allocations = pd.DataFrame({
+        "Jurisdiction": np.repeat(jurisdictions, len(weeks)),
+        "Week of Allocations": np.tile(weeks.strftime("%m/%d/%Y"), len(jurisdictions)),
+        "1st Dose Allocations": 100*rng.integers(0, 5000, size=len(jurisdictions)*len(weeks))})
+    if second_doses:
+        allocations["2nd Dose Allocations"] = 100*rng.integers(0, 5000, size=len(allocations))
+    return allocations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the feature extraction on synthetic data.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="state")
+    parser.add_argument("--data-dir", help="by default benchmark/<scale>/data")
+    parser.add_argument("--output", help="by default benchmark/<scale>/report.json")
+    parser.add_argument("--no-trace-memory", action="store_true")
+    args = parser.parse_args()
+    data_dir = args.data_dir or os.path.join("benchmark", args.scale, "data")
+    output = args.output or os.path.join("benchmark", args.scale, "report.json")
+    # regenerate unless the sources there were written at this scale
+    parameters = dict(SCALES[args.scale], seed=0)
+    if generation_parameters(data_dir) != parameters:
+        generate_sources(data_dir, **parameters)
+    run_benchmark(data_dir, output=output, trace_memory=not args.no_trace_memory, scale=args.scale)
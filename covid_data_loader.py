@@ -0,0 +1,639 @@
+import io
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from contextlib import nullcontext
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = "data"
+CACHE_DIR = os.path.join(DATA_DIR, ".cache")
+LRU_SIZE = 8
+STREAM_TRIPS = False
+CHUNK_SIZE = 500000
+APPEND_CHECK_BYTES = 4096
+STAGE_TIMER = None
+
+TRIPS_FILE = "Trips_by_Distance.csv"
+EPICURVE_FILE = "epicurve_rpt_date.csv"
+PFIZER_FILE = "COVID-19_Vaccine_Distribution_Allocations_by_Jurisdiction_-_Pfizer.csv"
+MODERNA_FILE = "COVID-19_Vaccine_Distribution_Allocations_by_Jurisdiction_-_Moderna.csv"
+JANSSEN_FILE = "COVID-19_Vaccine_Distribution_Allocations_by_Jurisdiction_-_Janssen.csv"
+
+TRIP_BINS = ["Number of Trips <1", "Number of Trips 1-3", "Number of Trips 3-5", "Number of Trips 5-10",
+             "Number of Trips 10-25", "Number of Trips 25-50", "Number of Trips 50-100",
+             "Number of Trips 100-250", "Number of Trips 250-500", "Number of Trips >=500"]
+TRIP_COLUMNS = ["Date", "State Postal Code", "County Name", "Population Staying at Home",
+                "Population Not Staying at Home", "Number of Trips"] + TRIP_BINS
+
+_lru = OrderedDict()
+_hashes = {}
+
+
+def read_source(file_name):
+    '''
+    Load one of the raw data sources as a DataFrame, parsing the csv at most
+    once. The parsed columns are stored as typed .npy files under CACHE_DIR
+    and the resulting frame is kept in an in-process LRU, so repeated calls
+    only cost an os.stat. The on-disk cache is rebuilt whenever the size or
+    modification time of the source changes and its content hash differs.
+
+    Parameters
+    ----------
+    - file_name : name of the csv file inside DATA_DIR, e.g. TRIPS_FILE
+    Returns
+    -------
+    - frame : DataFrame with the same columns and values as pd.read_csv; it is
+        shared between callers and must not be modified in place
+    '''
+    source_path = os.path.join(DATA_DIR, file_name)
+    stat = os.stat(source_path)
+    fingerprint = (stat.st_mtime_ns, stat.st_size)
+
+    if source_path in _lru:
+        cached_fingerprint, frame = _lru[source_path]
+        if cached_fingerprint == fingerprint:
+            _lru.move_to_end(source_path)
+            return frame
+
+    cache_path = _cache_path(file_name)
+    frame = None
+    meta = _read_meta(cache_path)
+    if meta is not None and _meta_matches(meta, source_path, fingerprint, cache_path):
+        with stage("cache load"):
+            frame = _load_columns(cache_path, meta)
+    if frame is None:
+        with stage("csv parse"):
+            frame = pd.read_csv(source_path)
+        with stage("cache write"):
+            _store_columns(cache_path, frame, source_path, fingerprint)
+
+    _lru[source_path] = (fingerprint, frame)
+    _lru.move_to_end(source_path)
+    while len(_lru) > LRU_SIZE:
+        _lru.popitem(last=False)
+    return frame
+
+
+def clear_cache(on_disk=False):
+    '''
+    Drop every parsed source held in memory and, if on_disk is set, remove
+    the column and index stores under CACHE_DIR as well. Other caches kept
+    there, e.g. the results of covid_experiments.run_grid, are left alone.
+    '''
+    _lru.clear()
+    _trip_index[:] = [None, None]
+    if on_disk and os.path.isdir(CACHE_DIR):
+        for entry in os.listdir(CACHE_DIR):
+            path = os.path.join(CACHE_DIR, entry)
+            # our stores carry a meta.json, unfinished builds end in .tmp
+            if os.path.isfile(os.path.join(path, "meta.json")) or entry.endswith((".tmp", ".tmp.old")):
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def source_position(file_name):
+    '''
+    Mark how far a source has been read: the end of its last complete line,
+    with a hash of the bytes just before it so read_appended can tell
+    whether later versions of the file only append to it.
+
+    Parameters
+    ----------
+    - file_name : name of the csv file inside DATA_DIR, e.g. TRIPS_FILE
+    Returns
+    -------
+    - position : json-serializable dict to pass to read_appended
+    '''
+    source_path = os.path.join(DATA_DIR, file_name)
+    with open(source_path, "rb") as source:
+        source.seek(0, os.SEEK_END)
+        size = source.tell()
+        # a line still being written belongs to the next read
+        start = max(0, size - APPEND_CHECK_BYTES)
+        source.seek(start)
+        end = start + source.read().rfind(b"\n") + 1
+        return _position(source, end)
+
+
+def read_appended(file_name, position, **read_csv_args):
+    '''
+    Parse only the complete lines appended to a source since position, so a
+    daily update costs its new rows rather than the whole file.
+
+    Parameters
+    ----------
+    - file_name : name of the csv file inside DATA_DIR, e.g. TRIPS_FILE
+    - position : dict returned by source_position or read_appended
+    - read_csv_args : further arguments of pd.read_csv, e.g. usecols
+    Returns
+    -------
+    - frame : DataFrame of the appended rows with the columns of the file's
+        header, or None if the file was rewritten rather than appended to
+        since position, in which case the caller has to read it again
+    - position : the new position, after the appended rows
+    '''
+    source_path = os.path.join(DATA_DIR, file_name)
+    with open(source_path, "rb") as source:
+        header = source.readline()
+        if _position(source, position["offset"]) != position:
+            return None, source_position(file_name)
+        source.seek(position["offset"])
+        appended = source.read()
+        appended = appended[:appended.rfind(b"\n") + 1]
+        end = position["offset"] + len(appended)
+        with stage("csv parse"):
+            frame = pd.read_csv(io.BytesIO(header + appended), **read_csv_args)
+        return frame, _position(source, end)
+
+
+def _position(source, offset):
+    # the offset and a hash of the bytes before it, read from an open file
+    source.seek(max(0, offset - APPEND_CHECK_BYTES))
+    before = source.read(offset - max(0, offset - APPEND_CHECK_BYTES))
+    if len(before) != min(offset, APPEND_CHECK_BYTES):
+        # the file is now shorter than offset
+        return {"offset": offset, "sha1": None}
+    return {"offset": offset, "sha1": hashlib.sha1(before).hexdigest()}
+
+
+def stage(name):
+    '''
+    Mark a stage of the data pipeline, e.g. "csv parse" or "masking", as
+    `with stage(name):`. This does nothing unless STAGE_TIMER is set to a
+    function that takes the stage name and returns a context manager, which
+    is how covid_benchmark times the stages inside the public functions.
+    '''
+    if STAGE_TIMER is None:
+        return nullcontext()
+    return STAGE_TIMER(name)
+
+
+def _cache_path(file_name):
+    return os.path.join(CACHE_DIR, os.path.splitext(file_name)[0])
+
+
+def _file_hash(path):
+    # remembered per (path, mtime, size) so the csv and index caches share it
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _hashes:
+        digest = hashlib.sha1()
+        with open(path, "rb") as source:
+            for block in iter(lambda: source.read(1 << 20), b""):
+                digest.update(block)
+        _hashes[key] = digest.hexdigest()
+    return _hashes[key]
+
+
+def _read_meta(cache_path):
+    try:
+        with open(os.path.join(cache_path, "meta.json")) as meta_file:
+            return json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _meta_matches(meta, source_path, fingerprint, cache_path):
+    if (meta["mtime_ns"], meta["size"]) == fingerprint:
+        return True
+    if meta["size"] != fingerprint[1] or meta["sha1"] != _file_hash(source_path):
+        return False
+    # touched but unchanged: refresh the stored mtime so we do not hash again
+    meta["mtime_ns"] = fingerprint[0]
+    try:
+        _write_meta(cache_path, meta)
+    except OSError:
+        pass
+    return True
+
+
+def _write_meta(cache_path, meta):
+    handle, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=cache_path)
+    try:
+        with os.fdopen(handle, "w") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(tmp_path, os.path.join(cache_path, "meta.json"))
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _build_path(cache_path):
+    # a fresh directory per build, so processes that start cold together
+    # never write into, or delete, each other's half-built store
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    return tempfile.mkdtemp(prefix=os.path.basename(cache_path) + ".", suffix=".tmp",
+                            dir=os.path.dirname(cache_path))
+
+
+def _publish(tmp_path, cache_path):
+    # only renames touch the published path, so it is always either absent
+    # or a complete store; if another process published first, its store is
+    # moved aside and deleted and ours replaces it, which is harmless as both
+    # were built from the same source
+    old_path = tmp_path + ".old"
+    try:
+        os.replace(cache_path, old_path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.replace(tmp_path, cache_path)
+    finally:
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def _store_columns(cache_path, frame, source_path, fingerprint):
+    # numeric columns are saved as-is, text columns as int32 codes plus a
+    # fixed-width unicode table so nothing needs to be pickled
+    tmp_path = None
+    try:
+        tmp_path = _build_path(cache_path)
+        columns = []
+        for i, name in enumerate(frame.columns):
+            values = frame[name]
+            entry = {"name": name, "file": "col_{:03d}".format(i)}
+            if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+                np.save(os.path.join(tmp_path, entry["file"] + ".npy"), values.to_numpy())
+                entry["kind"] = "numeric"
+            else:
+                codes, uniques = pd.factorize(values)
+                np.save(os.path.join(tmp_path, entry["file"] + ".npy"), codes.astype(np.int32))
+                np.save(os.path.join(tmp_path, entry["file"] + "_labels.npy"), np.array(uniques, dtype=str))
+                # object columns of True, False and NaN are booleans too
+                entry["kind"] = "bool" if pd.api.types.infer_dtype(values, skipna=True) == "boolean" else "text"
+            columns.append(entry)
+        meta = {"mtime_ns": fingerprint[0], "size": fingerprint[1],
+                "sha1": _file_hash(source_path), "columns": columns}
+        _write_meta(tmp_path, meta)
+        _publish(tmp_path, cache_path)
+    except OSError:
+        # a read-only data directory only costs us the cache
+        if tmp_path is not None:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def _load_columns(cache_path, meta):
+    data = OrderedDict()
+    try:
+        for entry in meta["columns"]:
+            values = np.load(os.path.join(cache_path, entry["file"] + ".npy"))
+            if entry["kind"] != "numeric":
+                labels = np.load(os.path.join(cache_path, entry["file"] + "_labels.npy")).astype(object)
+                present = values >= 0
+                if entry["kind"] == "bool":
+                    labels = labels == "True"
+                if entry["kind"] == "bool" and present.all():
+                    # read_csv only gives a bool column when no value is missing
+                    values = labels[values]
+                else:
+                    decoded = np.empty(len(values), dtype=object)
+                    decoded[:] = np.nan
+                    decoded[present] = labels[values[present]]
+                    values = decoded
+            data[entry["name"]] = values
+    except (OSError, KeyError, ValueError):
+        return None
+    return pd.DataFrame(data)
+
+
+def read_trips(state_code, county_name=None, start_date=None, end_date=None, streaming=None):
+    '''
+    Select the Trips_by_Distance rows of a single state or county within a
+    date window, reading only the columns in TRIP_COLUMNS. By default the
+    rows are cut out of the sorted trip_index with binary searches. With
+    streaming enabled the csv is instead read in chunks of CHUNK_SIZE rows
+    and filtered as it is read, so peak memory follows the selected slice
+    rather than the national file.
+
+    Parameters
+    ----------
+    - state_code : string postal abbreviation code of the state, or a list
+        of such codes
+    - county_name : full "County Name" as it appears in the data, e.g.
+        "Fulton County", a list of such names, "all" for every county of the
+        state, or None for the state-level rows
+    - start_date, end_date : optional inclusive bounds on the trip date
+    - streaming : read the csv chunk by chunk; defaults to STREAM_TRIPS
+    Returns
+    -------
+    - travel : DataFrame with the TRIP_COLUMNS of the selected rows, sorted by
+        state, county and date, with the dates parsed as datetime64[ns] and a
+        fresh integer index; both ways of reading give the same dtypes
+    '''
+    if streaming is None:
+        streaming = STREAM_TRIPS
+    if not streaming:
+        index = trip_index()
+        with stage("masking"):
+            bounds = index_slices(index, state_code, county_name, start_date, end_date)
+            return _index_frame(index, bounds)
+
+    chunks = pd.read_csv(os.path.join(DATA_DIR, TRIPS_FILE), usecols=TRIP_COLUMNS,
+                         dtype={"State Postal Code": object, "County Name": object},
+                         chunksize=CHUNK_SIZE)
+    pieces = []
+    dtypes = {}
+    with stage("streaming scan"):
+        for chunk in chunks:
+            _widen_dtypes(dtypes, chunk)
+            pieces.append(_select_trips(chunk, state_code, county_name, start_date, end_date))
+    if not pieces:
+        return pd.DataFrame(columns=TRIP_COLUMNS)
+    travel = pd.concat(pieces).sort_values(["State Postal Code", "County Name", "Date"],
+                                           kind="mergesort", na_position="first")
+    return _trips_frame({name: travel[name].to_numpy() for name in TRIP_COLUMNS}, dtypes)
+
+
+TripIndex = namedtuple("TripIndex", ["state_codes", "county_names", "keys", "columns", "dtypes"])
+
+
+def trip_index():
+    '''
+    Open, or build, the sorted index over the trips source. Rows are ordered
+    by (state, county, date), with states and counties stored as integer
+    codes into the sorted state_codes and county_names tables (county code 0
+    marks the state-level rows) and dates as days since the epoch.
+
+    The index is kept on disk as a compact column store next to the csv
+    cache: codes and days in the smallest integer type that holds them and
+    counts as uint32 or float32 whenever that is lossless. The columns are
+    opened with np.load(mmap_mode="r"), so a valid store never touches the
+    csv and every process on a machine shares the same page cache copy. The
+    store follows the same size/mtime/hash invalidation as read_source. It is
+    built from a chunked read of the TRIP_COLUMNS, so a rebuild never holds
+    the national frame or adds it to the read_source caches.
+
+    Returns
+    -------
+    - index : TripIndex whose keys array packs (state, county, day) into one
+        sorted int64 per row, whose columns dict holds the sorted TRIP_COLUMNS
+        ("State Postal Code" and "County Name" as codes, "Date" as days) and
+        whose dtypes dict records the csv dtype of every numeric column
+    '''
+    source_path = os.path.join(DATA_DIR, TRIPS_FILE)
+    stat = os.stat(source_path)
+    fingerprint = (stat.st_mtime_ns, stat.st_size)
+    if _trip_index[0] == (source_path, fingerprint):
+        return _trip_index[1]
+
+    store_path = _cache_path(TRIPS_FILE) + "_index"
+    index = None
+    meta = _read_meta(store_path)
+    if meta is not None and _meta_matches(meta, source_path, fingerprint, store_path):
+        with stage("index load"):
+            index = _load_index(store_path, meta)
+    if index is None:
+        with stage("index build"):
+            index = _build_trip_index(source_path)
+            meta = _store_index(store_path, index, source_path, fingerprint)
+            if meta is not None:
+                index = _load_index(store_path, meta) or index
+    _trip_index[:] = [(source_path, fingerprint), index]
+    return index
+
+
+def index_slices(index, state_code, county_name=None, start_date=None, end_date=None):
+    '''
+    Locate the rows of a trip_index that read_trips would select, using binary
+    searches only. Every (state, county) group is a contiguous run of the
+    index, so each one comes back as a single [start, stop) range whose column
+    slices are views into the index.
+
+    Parameters
+    ----------
+    - index : TripIndex returned by trip_index
+    - state_code, county_name, start_date, end_date : as in read_trips
+    Returns
+    -------
+    - bounds : array of shape (groups, 2) with the start and stop row of
+        every selected (state, county) group, in index order
+    '''
+    state_list = [state_code] if isinstance(state_code, str) else list(state_code)
+    state_ids = [_lookup_code(index.state_codes, code) for code in sorted(set(state_list))]
+    state_ids = np.array([state_id for state_id in state_ids if state_id >= 0], dtype=np.int64)
+    n_counties = len(index.county_names)
+
+    if county_name is None:
+        group_states = state_ids
+        group_counties = np.zeros(len(state_ids), dtype=np.int64)
+    elif isinstance(county_name, str) and county_name == "all":
+        # the groups present in each state, found from its full key range
+        group_states, group_counties = [], []
+        for state_id in state_ids:
+            low = np.searchsorted(index.keys, _index_key(state_id, 1, _DAY_MIN, n_counties))
+            high = np.searchsorted(index.keys, _index_key(state_id, n_counties, _DAY_MAX, n_counties), side="right")
+            groups = np.unique(index.columns["County Name"][low:high])
+            group_states.append(np.full(len(groups), state_id))
+            group_counties.append(groups)
+        group_states = np.concatenate(group_states).astype(np.int64) if group_states else np.zeros(0, dtype=np.int64)
+        group_counties = np.concatenate(group_counties).astype(np.int64) if group_counties else np.zeros(0, dtype=np.int64)
+    else:
+        county_list = [county_name] if isinstance(county_name, str) else sorted(set(county_name))
+        county_ids = np.array([_lookup_code(index.county_names, name) + 1 for name in county_list], dtype=np.int64)
+        county_ids = county_ids[county_ids > 0]
+        group_states = np.repeat(state_ids, len(county_ids))
+        group_counties = np.tile(county_ids, len(state_ids))
+
+    start_day = _DAY_MIN if start_date is None else _to_day(start_date)
+    end_day = _DAY_MAX if end_date is None else _to_day(end_date)
+    low = np.searchsorted(index.keys, _index_key(group_states, group_counties, start_day, n_counties))
+    high = np.searchsorted(index.keys, _index_key(group_states, group_counties, end_day, n_counties), side="right")
+    # groups were generated in key order, so the ranges are already sorted
+    bounds = np.stack([low, high], axis=1)
+    return bounds[high > low]
+
+
+_trip_index = [None, None]
+_DAY_MIN = -(1 << 31)
+_DAY_MAX = (1 << 31) - 1
+
+
+def _build_trip_index(source_path):
+    # read in chunks of TRIP_COLUMNS only, keeping every chunk in its compact
+    # dtypes, so the full frame is never held and read_source is not involved
+    chunks = pd.read_csv(source_path, usecols=TRIP_COLUMNS,
+                         dtype={"State Postal Code": object, "County Name": object},
+                         chunksize=CHUNK_SIZE)
+    labels = {"State Postal Code": {}, "County Name": {}}
+    parts = {name: [] for name in TRIP_COLUMNS}
+    dtypes = {}
+    for chunk in chunks:
+        for name, seen in labels.items():
+            # codes in order of first appearance for now, -1 for missing
+            codes, uniques = pd.factorize(chunk[name])
+            lookup = np.array([seen.setdefault(label, len(seen)) for label in uniques] + [-1], dtype=np.int32)
+            parts[name].append(lookup[codes])
+        days = pd.to_datetime(chunk["Date"]).to_numpy().astype("datetime64[D]").astype(np.int64)
+        parts["Date"].append(_compact(days))
+        _widen_dtypes(dtypes, chunk)
+        for name in TRIP_COLUMNS[3:]:
+            parts[name].append(_compact(chunk[name].to_numpy()))
+    columns = {name: np.concatenate(values) if values else np.zeros(0, dtype=np.int64)
+               for name, values in parts.items()}
+
+    # renumber the codes into the sorted label tables
+    tables = {}
+    for name, seen in labels.items():
+        tables[name] = np.array(sorted(seen), dtype=object)
+        ranks = np.empty(len(seen) + 1, dtype=np.int64)
+        ranks[np.array(list(seen.values()), dtype=np.int64)] = np.searchsorted(tables[name], list(seen))
+        ranks[-1] = -1
+        columns[name] = ranks[columns[name]]
+    state_ids = columns["State Postal Code"]
+    county_ids = columns["County Name"] + 1
+    keys = _index_key(state_ids, county_ids, columns["Date"], len(tables["County Name"]))
+
+    # rows without a state (the national totals) cannot be selected
+    rows = np.flatnonzero(state_ids >= 0)
+    rows = rows[np.argsort(keys[rows], kind="stable")]
+    columns["County Name"] = county_ids
+    columns = {name: columns[name][rows] for name in TRIP_COLUMNS}
+    dtypes = {name: np.dtype(dtype).str for name, dtype in dtypes.items()}
+    return TripIndex(tables["State Postal Code"], tables["County Name"], keys[rows], columns, dtypes)
+
+
+def _widen_dtypes(dtypes, chunk):
+    # widen each count column's dtype to the one read_csv would give the
+    # whole column; the streaming reader and the index share this, so both
+    # read paths return the same dtypes
+    for name in TRIP_COLUMNS[3:]:
+        dtypes[name] = np.result_type(dtypes.get(name, chunk[name].dtype), chunk[name].dtype)
+
+
+def _compact(values):
+    # smallest integer type for codes and days, uint32/float32 for counts
+    # only when every value survives the round trip
+    if values.dtype.kind in "iu":
+        for dtype in (np.uint8, np.int16, np.uint32, np.int32):
+            info = np.iinfo(dtype)
+            if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+                return values.astype(dtype)
+        return values
+    if values.dtype.kind == "f":
+        finite = np.isfinite(values)
+        if finite.all() and (values >= 0).all() and (values <= np.iinfo(np.uint32).max).all() \
+                and (values == np.round(values)).all():
+            return values.astype(np.uint32)
+        single = values.astype(np.float32)
+        if np.array_equal(single.astype(values.dtype), values, equal_nan=True):
+            return single
+    return values
+
+
+def _store_index(store_path, index, source_path, fingerprint):
+    tmp_path = None
+    try:
+        tmp_path = _build_path(store_path)
+        np.save(os.path.join(tmp_path, "keys.npy"), index.keys)
+        columns = []
+        for i, name in enumerate(TRIP_COLUMNS):
+            entry = {"name": name, "file": "col_{:03d}".format(i), "dtype": index.dtypes.get(name)}
+            np.save(os.path.join(tmp_path, entry["file"] + ".npy"), _compact(index.columns[name]))
+            columns.append(entry)
+        meta = {"mtime_ns": fingerprint[0], "size": fingerprint[1], "sha1": _file_hash(source_path),
+                "state_codes": [str(code) for code in index.state_codes],
+                "county_names": [str(name) for name in index.county_names],
+                "columns": columns}
+        _write_meta(tmp_path, meta)
+        _publish(tmp_path, store_path)
+        return meta
+    except OSError:
+        if tmp_path is not None:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return None
+
+
+def _load_index(store_path, meta):
+    try:
+        keys = np.load(os.path.join(store_path, "keys.npy"), mmap_mode="r")
+        columns = {}
+        dtypes = {}
+        for entry in meta["columns"]:
+            columns[entry["name"]] = np.load(os.path.join(store_path, entry["file"] + ".npy"), mmap_mode="r")
+            if entry["dtype"] is not None:
+                dtypes[entry["name"]] = entry["dtype"]
+    except (OSError, KeyError, ValueError):
+        return None
+    return TripIndex(np.array(meta["state_codes"], dtype=object), np.array(meta["county_names"], dtype=object),
+                     keys, columns, dtypes)
+
+
+def _index_key(state_ids, county_ids, days, n_counties):
+    # (state, county) group in the high 32 bits, offset day in the low 32 bits
+    group = np.asarray(state_ids, dtype=np.int64)*(n_counties + 1) + np.asarray(county_ids, dtype=np.int64)
+    return (group << 32) + (np.asarray(days, dtype=np.int64) - _DAY_MIN)
+
+
+def _lookup_code(table, label):
+    position = int(np.searchsorted(table, label))
+    if position < len(table) and table[position] == label:
+        return position
+    return -1
+
+
+def _to_day(date):
+    return int(np.datetime64(pd.Timestamp(date).normalize().to_datetime64(), "D").astype(np.int64))
+
+
+def _index_frame(index, bounds):
+    if len(bounds) == 1:
+        rows = slice(bounds[0, 0], bounds[0, 1])
+    else:
+        rows = np.concatenate([np.arange(start, stop) for start, stop in bounds]) if len(bounds) else np.zeros(0, dtype=np.int64)
+    data = {}
+    for name in TRIP_COLUMNS:
+        values = index.columns[name][rows]
+        if name == "Date":
+            values = values.astype(np.int64).astype("datetime64[D]")
+        elif name == "State Postal Code":
+            values = index.state_codes[values]
+        elif name == "County Name":
+            county_labels = np.concatenate([[np.nan], index.county_names]).astype(object)
+            values = county_labels[values]
+        data[name] = values
+    return _trips_frame(data, index.dtypes)
+
+
+def _trips_frame(data, dtypes):
+    # both read_trips paths build their frame here so the dtypes agree: dates
+    # as datetime64[ns], the text columns as pandas infers them from objects,
+    # and the counts in the dtype of the whole csv column
+    frame = OrderedDict()
+    for name in TRIP_COLUMNS:
+        values = np.asarray(data[name])
+        if name == "Date":
+            frame[name] = values.astype("datetime64[ns]")
+        elif name in ("State Postal Code", "County Name"):
+            frame[name] = values.astype(object)
+        else:
+            frame[name] = values.astype(dtypes[name])
+    return pd.DataFrame(frame)
+
+
+def _select_trips(frame, state_code, county_name, start_date, end_date):
+    # cheap string predicates first, dates are only parsed on the survivors
+    if isinstance(state_code, str):
+        mask = np.array(frame["State Postal Code"] == state_code)
+    else:
+        mask = np.array(frame["State Postal Code"].isin(state_code))
+    if county_name is None:
+        mask = np.logical_and(mask, np.array(pd.isnull(frame["County Name"])))
+    elif isinstance(county_name, str) and county_name == "all":
+        mask = np.logical_and(mask, np.array(pd.notnull(frame["County Name"])))
+    elif isinstance(county_name, str):
+        mask = np.logical_and(mask, np.array(frame["County Name"] == county_name))
+    else:
+        mask = np.logical_and(mask, np.array(frame["County Name"].isin(county_name)))
+    selected = frame.loc[mask, TRIP_COLUMNS]
+    selected = selected.assign(Date=pd.to_datetime(selected["Date"]).dt.normalize())
+    keep = np.ones(len(selected), dtype=bool)
+    if start_date is not None:
+        keep = np.logical_and(keep, np.array(selected["Date"] >= start_date))
+    if end_date is not None:
+        keep = np.logical_and(keep, np.array(selected["Date"] <= end_date))
+    return selected.loc[keep]
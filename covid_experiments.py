@@ -0,0 +1,193 @@
+import os
+import json
+import pickle
+import hashlib
+import inspect
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import covid_data_loader
+import covid_feature_extraction
+from covid_model_selection import lasso_path_cv, var_lag_sweep
+from covid_backtest import walk_forward_backtest, ALLOCATION_VAR_COLUMNS
+from covid_smoothers import rbf_smoothing_sweep
+
+REGIONS = ["Georgia", "Fulton", "Lowndes", "Chatham"]
+MODEL_FEATURES = covid_feature_extraction.FEATURE_LABELS + ["cumulative_allocations"]
+
+
+def lasso_model(data, target_label):
+    '''
+    Cross-validated Lasso path of the target on the case and death features
+    and the cumulative allocations, as lasso_coefs in Lasso_Combined. Days
+    with a missing feature are dropped, and the features are standardized
+    so coordinate descent converges; the coefficients are on that scale.
+    Nearly collinear features, e.g. cumulative cases and deaths, can still
+    keep the smallest lambdas from converging.
+    '''
+    data = data.dropna()
+    X = data[MODEL_FEATURES]
+    feature_mean = X.mean()
+    feature_scale = X.std(ddof=0).replace(0, 1)
+    # run_grid already spreads the cells over every core
+    coefs, scores, best_lambda, best_index = lasso_path_cv((X - feature_mean)/feature_scale, data[target_label],
+                                                           n_jobs=1)
+    return {"feature_labels": MODEL_FEATURES, "feature_mean": feature_mean.to_numpy(),
+            "feature_scale": feature_scale.to_numpy(), "coefs": coefs, "scores": scores,
+            "best_lambda": best_lambda, "best_coefs": coefs[best_index]}
+
+
+def var_model(data, target_label, max_lag=40, train_frac=0.85):
+    '''
+    AIC and hold-out MSE of every VAR lag order, as VAR_wrapper, over the
+    days with every series present.
+    '''
+    vector_data = data[[target_label] + ALLOCATION_VAR_COLUMNS].dropna()
+    lags, aic_vals, mse_vals = var_lag_sweep(vector_data, max_lag, train_frac)
+    return {"lags": lags, "aic": aic_vals, "mse": mse_vals}
+
+
+def backtest_model(data, target_label, lag=7, min_train=150, horizon=14):
+    '''
+    Walk-forward per-horizon error curve of a VAR(lag), over the days with
+    every series present.
+    '''
+    vector_data = data[[target_label] + ALLOCATION_VAR_COLUMNS].dropna()
+    horizons, mse_by_horizon, errors, origins = walk_forward_backtest(vector_data, lag, min_train, horizon)
+    return {"horizons": horizons, "mse": mse_by_horizon, "errors": errors, "origins": origins}
+
+
+def rbf_model(data, target_label, n_centers=200, epsilon=1.0):
+    '''
+    Cross-validated smoothing sweep of a low-rank RBF fit on the case and
+    death features and the cumulative allocations, each divided by its
+    training-fold maximum, as multi_spline_wrapper. Days with a missing
+    feature are dropped.
+    '''
+    data = data.dropna()
+    scores, best_smoothing = rbf_smoothing_sweep(data[MODEL_FEATURES], data[target_label], n_centers=n_centers,
+                                                 epsilon=epsilon)
+    return {"feature_labels": MODEL_FEATURES, "scores": scores, "best_smoothing": best_smoothing}
+
+
+MODELS = {"lasso": (lasso_model, {}),
+          "var": (var_model, {}),
+          "backtest": (backtest_model, {}),
+          "rbf": (rbf_model, {})}
+
+
+def run_grid(regions=REGIONS, target_labels=covid_feature_extraction.TARGET_LABELS, models=MODELS,
+             n_jobs=None, cache_dir=None):
+    '''
+    Run every (region, target, model) cell of an experiment grid. The data of
+    each (region, target) pair is extracted once, and every cell is keyed by a
+    hash of that data, its parameters, the model's source code, and the source
+    of every project module the model reaches, e.g. covid_model_selection for
+    the Lasso. Cells already in the cache are loaded, and the rest run in a
+    process pool. After one model or its modules change, only the cells that
+    depend on them are recomputed.
+
+    Parameters
+    ----------
+    - regions : list of regions as in covid_feature_extraction.region_data
+    - target_labels : list of target labels
+    - models : dict mapping a model name to (function, params); the function
+        must be defined at module level and is called as
+        function(data, target_label, **params)
+    - n_jobs : number of worker processes, None for all cores
+    - cache_dir : directory of the result cache, by default "experiments"
+        inside the data cache directory
+    Returns
+    -------
+    - results : dict mapping (region, target_label, model name) to the
+        result of that cell
+    '''
+    if cache_dir is None:
+        cache_dir = os.path.join(covid_data_loader.CACHE_DIR, "experiments")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    results = {}
+    pending = []
+    for region in regions:
+        for target_label in target_labels:
+            data = covid_feature_extraction.region_data(region, target_label)
+            data_hash = pd.util.hash_pandas_object(data).values.tobytes() + repr(list(data.columns)).encode()
+            for name, (function, params) in models.items():
+                key = _cell_key(data_hash, name, function, params)
+                cache_path = os.path.join(cache_dir, key + ".pkl")
+                if os.path.exists(cache_path):
+                    with open(cache_path, "rb") as cache_file:
+                        results[(region, target_label, name)] = pickle.load(cache_file)
+                else:
+                    pending.append(((region, target_label, name), cache_path, function, data, target_label, params))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [(cell, cache_path, pool.submit(function, data, target_label, **params))
+                       for cell, cache_path, function, data, target_label, params in pending]
+            for cell, cache_path, future in futures:
+                results[cell] = future.result()
+                tmp_path = cache_path + ".tmp"
+                with open(tmp_path, "wb") as cache_file:
+                    pickle.dump(results[cell], cache_file)
+                os.replace(tmp_path, cache_path)
+    return results
+
+
+def _cell_key(data_hash, name, function, params):
+    digest = hashlib.sha256()
+    digest.update(data_hash)
+    digest.update(name.encode())
+    for source in _model_sources(function):
+        digest.update(source.encode())
+    digest.update(json.dumps(params, sort_keys=True, default=repr).encode())
+    return digest.hexdigest()
+
+
+def _model_sources(function):
+    # the model's own source, the constants it reads, and the source of every
+    # module of this project it reaches, following their imports, so editing
+    # e.g. lasso_path_cv invalidates the lasso cells but not the others
+    sources = [_source(function)]
+    modules = []
+    for global_name in sorted(_code_names(function.__code__)):
+        if global_name not in function.__globals__:
+            continue
+        value = function.__globals__[global_name]
+        if inspect.ismodule(value) or callable(value):
+            modules.append(value if inspect.ismodule(value) else inspect.getmodule(value))
+        else:
+            sources.append(global_name + " = " + repr(value))
+
+    seen = {}
+    while modules:
+        module = modules.pop()
+        if module is None or module.__name__ in seen or not _is_local(module):
+            continue
+        seen[module.__name__] = _source(module)
+        for value in vars(module).values():
+            if inspect.ismodule(value) or callable(value):
+                modules.append(value if inspect.ismodule(value) else inspect.getmodule(value))
+    return sources + [seen[module_name] for module_name in sorted(seen)]
+
+
+def _code_names(code):
+    names = set(code.co_names)
+    for constant in code.co_consts:
+        if inspect.iscode(constant):
+            names |= _code_names(constant)
+    return names
+
+
+def _is_local(module):
+    module_file = getattr(module, "__file__", None)
+    return module_file is not None and \
+        os.path.dirname(os.path.abspath(module_file)) == os.path.dirname(os.path.abspath(__file__))
+
+
+def _source(target):
+    try:
+        return inspect.getsource(target)
+    except (OSError, TypeError):
+        return target.__module__ + "." + target.__qualname__ if hasattr(target, "__qualname__") else target.__name__
@@ -2,7 +2,33 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
-def county_extraction(county_name, target_label):
+from covid_data_loader import (read_source, read_trips, stage, EPICURVE_FILE,
+                               PFIZER_FILE, MODERNA_FILE, JANSSEN_FILE)
+
+ALLOCATION_FILES = [PFIZER_FILE, MODERNA_FILE, JANSSEN_FILE]
+TARGET_LABELS = ["Population", "Long", "Medium", "Short"]
+CASE_COLUMNS = ["total_cases", "total_cases_cum", "moving_avg_total_cases",
+                "deaths", "death_cum", "moving_avg_deaths"]
+FEATURE_LABELS = ["Cases per 100k", "Cumulative Cases per 100k", "Moving Average Cases per 100k",
+                  "Deaths per 100k", "Cumulative Deaths per 100k", "Moving Average Deaths per 100k"]
+MANUFACTURERS = ["Pfizer", "Moderna", "Janssen"]
+DOSE_LABELS = ["1st Dose Allocations", "2nd Dose Allocations"]
+
+STATE_CODES = {
+    "Alabama": "AL", "Alaska": "AK", "Arizona": "AZ", "Arkansas": "AR", "California": "CA",
+    "Colorado": "CO", "Connecticut": "CT", "Delaware": "DE", "District of Columbia": "DC",
+    "Florida": "FL", "Georgia": "GA", "Hawaii": "HI", "Idaho": "ID", "Illinois": "IL",
+    "Indiana": "IN", "Iowa": "IA", "Kansas": "KS", "Kentucky": "KY", "Louisiana": "LA",
+    "Maine": "ME", "Maryland": "MD", "Massachusetts": "MA", "Michigan": "MI", "Minnesota": "MN",
+    "Mississippi": "MS", "Missouri": "MO", "Montana": "MT", "Nebraska": "NE", "Nevada": "NV",
+    "New Hampshire": "NH", "New Jersey": "NJ", "New Mexico": "NM", "New York": "NY",
+    "North Carolina": "NC", "North Dakota": "ND", "Ohio": "OH", "Oklahoma": "OK", "Oregon": "OR",
+    "Pennsylvania": "PA", "Rhode Island": "RI", "South Carolina": "SC", "South Dakota": "SD",
+    "Tennessee": "TN", "Texas": "TX", "Utah": "UT", "Vermont": "VT", "Virginia": "VA",
+    "Washington": "WA", "West Virginia": "WV", "Wisconsin": "WI", "Wyoming": "WY"}
+
+
+def county_extraction(county_name, target_label, start_date="2020-02-29", end_date="2021-04-10"):
     '''
     Format the data such that the feature matrix X contains the data vectors
     parametrizing the pandemic and the label vector y contains the information
@@ -15,6 +41,7 @@ def county_extraction(county_name, target_label):
         Short corresponding to fractional population not staying home on a given
         day and the fractions of long (>100 miles), medium (10-100 miles), and
         short (<10 miles) trips in the county on a given day.
+    - start_date, end_date : inclusive bounds of the extraction window
     Returns
     -------
     - county_trip_dates : the date corresponding to each datum
@@ -24,33 +51,17 @@ def county_extraction(county_name, target_label):
     - feature_labels : the names of the features corresponding to the columns
         of the feature matrix
     '''
-    trips = pd.read_csv("data/Trips_by_Distance.csv")
-    epicurve_report_date = pd.read_csv("data/epicurve_rpt_date.csv")
-
-    trip_indices = np.logical_and(np.array(trips["County Name"] == (county_name + " County")), np.array(trips["State Postal Code"] == "GA"))
-    trip_indices = np.logical_and(trip_indices, np.array(pd.to_datetime(trips["Date"]) >= "2020-02-29"))
-    trip_indices = np.logical_and(trip_indices, np.array(pd.to_datetime(trips["Date"]) <= "2021-04-10"))
-    county_travel = trips.loc[trip_indices].reset_index()
+    county_travel = read_trips("GA", county_name + " County", start_date, end_date)
+    epicurve_report_date = read_source(EPICURVE_FILE)
 
     county_population = (county_travel["Population Staying at Home"] + county_travel["Population Not Staying at Home"]).iloc[0]
-    county_trip_dates = pd.to_datetime(county_travel["Date"])
+    with stage("date conversion"):
+        county_trip_dates = pd.to_datetime(county_travel["Date"])
     
-    if target_label == "Population":
-        county_travelers = county_travel["Population Not Staying at Home"]
-        county_y = county_travelers/county_population
-    elif target_label == "Long":
-        county_long_trips = county_travel["Number of Trips 100-250"] + county_travel["Number of Trips 250-500"] + county_travel["Number of Trips >=500"]
-        county_y = county_long_trips/county_travel["Number of Trips"]
-    elif target_label == "Medium":
-        county_med_trips = county_travel["Number of Trips 10-25"] + county_travel["Number of Trips 25-50"] + county_travel["Number of Trips 50-100"]
-        county_y = county_med_trips/county_travel["Number of Trips"]
-    elif target_label == "Short":
-        county_short_trips = county_travel["Number of Trips <1"] + county_travel["Number of Trips 1-3"] + county_travel["Number of Trips 3-5"] + county_travel["Number of Trips 5-10"]
-        county_y = county_short_trips/county_travel["Number of Trips"]
+    county_y = travel_target(county_travel, target_label)
     
-    case_indices = np.logical_and(np.array(epicurve_report_date["county"] == county_name), np.array(epicurve_report_date["report_date"] <= "2021-04-10"))
-    case_indices = np.logical_and(case_indices, np.array(epicurve_report_date["report_date"] >= "2020-02-29"))
-    county_cases = epicurve_report_date.loc[case_indices].reset_index()
+    with stage("masking"):
+        county_cases = _case_rows(epicurve_report_date, county_name, start_date, end_date)
     
     county_case_dates = pd.to_datetime(county_cases["report_date"])
     county_case_numbers = county_cases["total_cases"]
@@ -60,23 +71,25 @@ def county_extraction(county_name, target_label):
     county_death_cum = county_cases["death_cum"]
     county_death_ma = county_cases["moving_avg_deaths"]
     
-    county_case_frac = 1e5*county_case_numbers/county_population
-    county_death_frac = 1e5*county_death_numbers/county_population
+    with stage("feature computation"):
+        county_case_frac = 1e5*county_case_numbers/county_population
+        county_death_frac = 1e5*county_death_numbers/county_population
     
-    county_case_cum_frac = 1e5*county_case_cum/county_population
-    county_death_cum_frac = 1e5*county_death_cum/county_population
+        county_case_cum_frac = 1e5*county_case_cum/county_population
+        county_death_cum_frac = 1e5*county_death_cum/county_population
     
-    county_case_ma_frac = 1e5*county_case_ma/county_population
-    county_death_ma_frac = 1e5*county_death_ma/county_population
+        county_case_ma_frac = 1e5*county_case_ma/county_population
+        county_death_ma_frac = 1e5*county_death_ma/county_population
 
     feature_labels = ["Cases per 100k", "Cumulative Cases per 100k", "Moving Average Cases per 100k",
                       "Deaths per 100k", "Cumulative Deaths per 100k", "Moving Average Deaths per 100k"]
-    feature_matrix = pd.concat([county_case_frac, county_case_cum_frac, county_case_ma_frac,
-                                county_death_frac, county_death_cum_frac, county_death_ma_frac],axis=1)
+    with stage("concat"):
+        feature_matrix = pd.concat([county_case_frac, county_case_cum_frac, county_case_ma_frac,
+                                    county_death_frac, county_death_cum_frac, county_death_ma_frac],axis=1)
     return county_trip_dates, county_y, feature_matrix, feature_labels
 
 
-def state_extraction(target_label):
+def state_extraction(target_label, start_date="2020-02-29", end_date="2021-04-10"):
     '''
     Format the data such that the feature matrix X contains the data vectors
     parametrizing the pandemic and the label vector y contains the information
@@ -88,6 +101,7 @@ def state_extraction(target_label):
         Short corresponding to fractional population not staying home on a given
         day and the fractions of long (>100 miles), medium (10-100 miles), and
         short (<10 miles) trips in Georgia on a given day.
+    - start_date, end_date : inclusive bounds of the extraction window
     Returns
     -------
     - state_trip_dates : the date corresponding to each datum
@@ -97,35 +111,17 @@ def state_extraction(target_label):
     - feature_labels : the names of the features corresponding to the columns
         of the feature matrix
     '''
-    trips = pd.read_csv("data/Trips_by_Distance.csv")
-    epicurve_report_date = pd.read_csv("data/epicurve_rpt_date.csv")
-
-    trip_indices = np.array(trips["State Postal Code"] == "GA")
-    trip_indices = np.logical_and(trip_indices, np.array(pd.to_datetime(trips["Date"]) >= "2020-02-29"))
-    trip_indices = np.logical_and(trip_indices, np.array(pd.to_datetime(trips["Date"]) <= "2021-04-10"))
-    state_travel = trips.loc[trip_indices].reset_index()
-    trip_indices = np.where(pd.isnull(state_travel["County Name"]))
-    state_travel = state_travel.loc[trip_indices]
+    state_travel = read_trips("GA", None, start_date, end_date)
+    epicurve_report_date = read_source(EPICURVE_FILE)
 
     state_population = (state_travel["Population Staying at Home"] + state_travel["Population Not Staying at Home"]).iloc[0]
-    state_trip_dates = pd.to_datetime(state_travel["Date"])
-
-    if target_label == "Population":
-        state_travelers = state_travel["Population Not Staying at Home"]
-        state_y = state_travelers/state_population
-    elif target_label == "Long":
-        state_long_trips = state_travel["Number of Trips 100-250"] + state_travel["Number of Trips 250-500"] + state_travel["Number of Trips >=500"]
-        state_y = state_long_trips/state_travel["Number of Trips"]
-    elif target_label == "Medium":
-        state_med_trips = state_travel["Number of Trips 10-25"] + state_travel["Number of Trips 25-50"] + state_travel["Number of Trips 50-100"]
-        state_y = state_med_trips/state_travel["Number of Trips"]
-    elif target_label == "Short":
-        state_short_trips = state_travel["Number of Trips <1"] + state_travel["Number of Trips 1-3"] + state_travel["Number of Trips 3-5"] + state_travel["Number of Trips 5-10"]
-        state_y = state_short_trips/state_travel["Number of Trips"]
-
-    case_indices = np.logical_and(np.array(epicurve_report_date["county"] == "Georgia"), np.array(epicurve_report_date["report_date"] <= "2021-04-10"))
-    case_indices = np.logical_and(case_indices, np.array(epicurve_report_date["report_date"] >= "2020-02-29"))
-    state_cases = epicurve_report_date.loc[case_indices].reset_index()
+    with stage("date conversion"):
+        state_trip_dates = pd.to_datetime(state_travel["Date"])
+
+    state_y = travel_target(state_travel, target_label)
+
+    with stage("masking"):
+        state_cases = _case_rows(epicurve_report_date, "Georgia", start_date, end_date)
 
     state_case_dates = pd.to_datetime(state_cases["report_date"])
     state_case_numbers = state_cases["total_cases"]
@@ -135,26 +131,257 @@ def state_extraction(target_label):
     state_death_cum = state_cases["death_cum"]
     state_death_ma = state_cases["moving_avg_deaths"]
 
-    state_case_frac = 1e5*state_case_numbers/state_population
-    state_death_frac = 1e5*state_death_numbers/state_population
+    with stage("feature computation"):
+        state_case_frac = 1e5*state_case_numbers/state_population
+        state_death_frac = 1e5*state_death_numbers/state_population
 
-    state_case_cum_frac = 1e5*state_case_cum/state_population
-    state_death_cum_frac = 1e5*state_death_cum/state_population
+        state_case_cum_frac = 1e5*state_case_cum/state_population
+        state_death_cum_frac = 1e5*state_death_cum/state_population
 
-    state_case_ma_frac = 1e5*state_case_ma/state_population
-    state_death_ma_frac = 1e5*state_death_ma/state_population
+        state_case_ma_frac = 1e5*state_case_ma/state_population
+        state_death_ma_frac = 1e5*state_death_ma/state_population
 
     feature_labels = ["Cases per 100k", "Cumulative Cases per 100k", "Moving Average Cases per 100k",
                       "Deaths per 100k", "Cumulative Deaths per 100k", "Moving Average Deaths per 100k"]
-    state_X = pd.concat([state_case_frac, state_case_cum_frac, state_case_ma_frac,
-                         state_death_frac, state_death_cum_frac, state_death_ma_frac],axis=1)
+    with stage("concat"):
+        state_X = pd.concat([state_case_frac, state_case_cum_frac, state_case_ma_frac,
+                             state_death_frac, state_death_cum_frac, state_death_ma_frac],axis=1)
     return state_trip_dates, state_y, state_X, feature_labels
 
 
-def first_dose(state_name, state_code, target_label):
+def county_panel(county_names="all", target_labels=TARGET_LABELS, start_date="2020-02-29", end_date="2021-04-10"):
+    '''
+    Extract the features and targets of many Georgia counties at once. The
+    trips and case data are each filtered a single time and scattered into
+    dense arrays aligned on the calendar days of the window, by default
+    February 29th, 2020 to April 10th, 2021; days missing from a source are
+    left as NaN.
+    
+    Parameters
+    ----------
+    - county_names : list of distinct county names (without the " County"
+        suffix) or "all" for every county in the trips data
+    - target_labels : list of target labels, each one of Population, Long,
+        Medium, or Short as in county_extraction
+    - start_date, end_date : inclusive bounds of the extraction window
+    Returns
+    -------
+    - panel_dates : the date corresponding to each entry of the date axis
+    - panel_counties : the county names along the county axis
+    - panel_y : array of shape (county, date, target) with the targets
+    - panel_X : array of shape (county, date, feature) with the numbers,
+        totals, and moving averages of the cases and deaths per 100k residents
+    - feature_labels : the names of the features along the last axis of panel_X
+    - county_populations : the population of each county
+    '''
+    if isinstance(county_names, str) and county_names == "all":
+        county_travel = read_trips("GA", "all", start_date, end_date)
+    else:
+        county_travel = read_trips("GA", [name + " County" for name in county_names], start_date, end_date)
+    epicurve_report_date = read_source(EPICURVE_FILE)
+
+    panel_dates = pd.date_range(start_date, end_date)
+    with stage("date conversion"):
+        trip_dates = pd.to_datetime(county_travel["Date"]).dt.normalize()
+        county_travel = county_travel.assign(Date=trip_dates).sort_values("Date", kind="mergesort")
+    travel_counties = county_travel["County Name"].str.slice(stop=-len(" County"))
+    if isinstance(county_names, str) and county_names == "all":
+        panel_counties = sorted(travel_counties.unique())
+    else:
+        panel_counties = list(county_names)
+    county_codes = pd.Index(panel_counties)
+    if county_codes.has_duplicates:
+        duplicates = sorted(county_codes[county_codes.duplicated()].unique())
+        raise ValueError("county_names lists {} more than once".format(", ".join(duplicates)))
+
+    # population from the first day each county appears, as in county_extraction
+    trip_rows = county_codes.get_indexer(travel_counties)
+    trip_days = panel_dates.get_indexer(county_travel["Date"])
+    row_populations = np.array(county_travel["Population Staying at Home"] + county_travel["Population Not Staying at Home"], dtype=float)
+    county_populations = np.full(len(panel_counties), np.nan)
+    _, earliest = np.unique(trip_rows, return_index=True)
+    county_populations[trip_rows[earliest]] = row_populations[earliest]
+
+    panel_y = np.full((len(panel_counties), len(panel_dates), len(target_labels)), np.nan)
+    for k, target_label in enumerate(target_labels):
+        panel_y[trip_rows, trip_days, k] = np.array(travel_target(county_travel, target_label,
+                                                                  county_populations[trip_rows]))
+
+    with stage("masking"):
+        case_indices = np.array(epicurve_report_date["county"].isin(panel_counties))
+        case_indices = np.logical_and(case_indices, np.array(epicurve_report_date["report_date"] <= _date_string(end_date)))
+        case_indices = np.logical_and(case_indices, np.array(epicurve_report_date["report_date"] >= _date_string(start_date)))
+        county_cases = epicurve_report_date.loc[case_indices]
+    case_rows = county_codes.get_indexer(county_cases["county"])
+    with stage("date conversion"):
+        case_days = panel_dates.get_indexer(pd.to_datetime(county_cases["report_date"]))
+
+    with stage("feature computation"):
+        panel_X = np.full((len(panel_counties), len(panel_dates), len(CASE_COLUMNS)), np.nan)
+        panel_X[case_rows, case_days] = 1e5*np.array(county_cases[CASE_COLUMNS], dtype=float)/county_populations[case_rows, None]
+    return panel_dates, panel_counties, panel_y, panel_X, list(FEATURE_LABELS), county_populations
+
+
+def region_data(region, target_label, start_date="2020-02-29", end_date="2021-04-10"):
+    '''
+    Collect everything the models use for one region into a single frame:
+    the case and death features per 100k residents, the doses allocated to
+    Georgia, and the target. There is one row per trips day; the features
+    are joined on their report dates, so a day missing from the epicurve
+    leaves NaN features rather than shifting the later rows.
+
+    Parameters
+    ----------
+    - region : "Georgia" for the state or the name of a Georgia county
+    - target_label : string specifying either the Population, Long, Medium, or
+        Short target as in county_extraction
+    - start_date, end_date : inclusive bounds of the extraction window
+    Returns
+    -------
+    - data : DataFrame indexed by date with the FEATURE_LABELS (cases and
+        deaths per 100k residents), "vaccine_allocations" (the doses
+        allocated that day), "cumulative_allocations" (all doses allocated
+        up to that day, as cumul_doses), and a target_label column
+    '''
+    if region == "Georgia":
+        dates, y, X, _ = state_extraction(target_label, start_date, end_date)
+    else:
+        dates, y, X, _ = county_extraction(region, target_label, start_date, end_date)
+    alloc_dates, _, doses = vaccine_allocations("Georgia", "GA", target_label, start_date, end_date)
+    with stage("masking"):
+        case_dates = _case_rows(read_source(EPICURVE_FILE), region, start_date, end_date)["report_date"]
+
+    with stage("concat"):
+        dates = pd.DatetimeIndex(dates).normalize()
+        features = pd.DataFrame(np.array(X, dtype=float), columns=FEATURE_LABELS,
+                                index=pd.DatetimeIndex(pd.to_datetime(case_dates)).normalize())
+        data = features.reindex(dates)
+        allocations = pd.Series(np.array(doses["Total Doses"]), index=pd.DatetimeIndex(alloc_dates))
+        data["vaccine_allocations"] = np.array(allocations.reindex(dates, fill_value=0), dtype=float)
+        # doses of a day without trips still count towards the later totals
+        cumulative = allocations.cumsum().reindex(dates, method="ffill").fillna(0)
+        data["cumulative_allocations"] = np.array(cumulative, dtype=float)
+        data[target_label] = np.array(y, dtype=float)
+    return data
+
+
+def vaccine_allocations(state_name, state_code, target_label, start_date="2020-12-01", end_date="2021-04-26"):
+    '''
+    Given a state, find the first, second, total, and cumulative doses of all
+    vaccines allocated to that state on each day of the window, by default
+    starting with December 1st, 2020. The allocation tables are parsed once
+    and aligned to the trip dates with a single reindex, so all dose series
+    come from one pass.
+    
+    Parameters
+    ----------
+    - state_name : string specifying the name of the state
+    - state_code : string postal abbreviation code corresponding to the
+        state being considered
+    - target_label : string specifying either the Population, Long, Medium, or
+        Short corresponding to fractional population not staying home on a given
+        day and the fractions of long (>100 miles), medium (10-100 miles), and
+        short (<10 miles) trips in Georgia on a given day.
+    - start_date, end_date : inclusive bounds of the extraction window
+    Returns
+    -------
+    - state_alloc_dates : the date corresponding to each datum
+    - state_y : the y vector as specified by the target_label parameter
+    - state_doses : DataFrame with the "1st Dose Allocations", "2nd Dose
+        Allocations", "Total Doses" and "Cumulative Doses" allocated to the
+        state on each day
+    '''
+    state_travel = read_trips(state_code, None, start_date, end_date)
+    state_y = travel_target(state_travel, target_label)
+    with stage("date conversion"):
+        state_alloc_dates = pd.to_datetime(state_travel["Date"]).dt.normalize()
+
+    with stage("allocation join"):
+        first_doses = np.zeros(len(state_alloc_dates), dtype=np.int64)
+        second_doses = np.zeros(len(state_alloc_dates), dtype=np.int64)
+        for file_name in ALLOCATION_FILES:
+            allocations = _allocation_table(file_name)
+            if state_name not in allocations.index.get_level_values("Jurisdiction"):
+                continue
+            state_allocations = allocations.xs(state_name, level="Jurisdiction")
+            state_allocations = state_allocations.reindex(state_alloc_dates, fill_value=0)
+            first_doses += state_allocations["1st Dose Allocations"].to_numpy()
+            second_doses += state_allocations["2nd Dose Allocations"].to_numpy()
+
+    with stage("concat"):
+        state_doses = pd.DataFrame({"1st Dose Allocations": first_doses,
+                                    "2nd Dose Allocations": second_doses})
+        state_doses["Total Doses"] = state_doses["1st Dose Allocations"] + state_doses["2nd Dose Allocations"]
+        state_doses["Cumulative Doses"] = state_doses["Total Doses"].cumsum()
+    return state_alloc_dates.reset_index(drop=True).rename("Week of Allocations"), state_y, state_doses
+
+
+def allocation_panel(target_labels=TARGET_LABELS, start_date="2020-12-01", end_date="2021-04-26"):
+    '''
+    Find the doses of every vaccine allocated to every jurisdiction on each
+    day of the window, by default starting with December 1st, 2020, together
+    with the state-level travel targets. Jurisdictions are matched to the
+    trips data through STATE_CODES; those without a postal code (cities,
+    territories, federal entities) keep NaN targets and populations.
+    
+    Parameters
+    ----------
+    - target_labels : list of target labels, each one of Population, Long,
+        Medium, or Short as in first_dose
+    - start_date, end_date : inclusive bounds of the extraction window
+    Returns
+    -------
+    - panel_dates : the date corresponding to each entry of the date axis
+    - jurisdictions : the jurisdiction names along the jurisdiction axis
+    - jurisdiction_codes : the postal code of each jurisdiction, or None
+    - panel_y : array of shape (jurisdiction, date, target) with the targets
+    - panel_doses : array of shape (jurisdiction, date, manufacturer, dose)
+        with the doses allocated per day, ordered as MANUFACTURERS and
+        DOSE_LABELS
+    - jurisdiction_populations : the population of each jurisdiction
+    '''
+    panel_dates = pd.date_range(start_date, end_date)
+    with stage("allocation join"):
+        allocation_tables = [_allocation_table(file_name) for file_name in ALLOCATION_FILES]
+        jurisdictions = sorted(set().union(*[table.index.get_level_values("Jurisdiction") for table in allocation_tables]))
+        jurisdiction_index = pd.Index(jurisdictions)
+        jurisdiction_codes = [STATE_CODES.get(name) for name in jurisdictions]
+
+        panel_doses = np.zeros((len(jurisdictions), len(panel_dates), len(MANUFACTURERS), len(DOSE_LABELS)))
+        for m, allocations in enumerate(allocation_tables):
+            rows = jurisdiction_index.get_indexer(allocations.index.get_level_values("Jurisdiction"))
+            days = panel_dates.get_indexer(allocations.index.get_level_values("Week of Allocations"))
+            in_window = days >= 0
+            panel_doses[rows[in_window], days[in_window], m] = np.array(allocations[DOSE_LABELS], dtype=float)[in_window]
+
+    state_travel = read_trips(list(STATE_CODES.values()), None, start_date, end_date)
+    with stage("date conversion"):
+        state_travel = state_travel.assign(Date=pd.to_datetime(state_travel["Date"]).dt.normalize()).sort_values("Date", kind="mergesort")
+    with stage("masking"):
+        # cities and territories have no postal code, so several jurisdictions
+        # share None and only the coded ones can be looked up
+        code_rows = {code: row for row, code in enumerate(jurisdiction_codes) if code is not None}
+        trip_rows = np.array(state_travel["State Postal Code"].map(code_rows).fillna(-1), dtype=np.int64)
+        trip_days = panel_dates.get_indexer(state_travel["Date"])
+        matched = trip_rows >= 0
+        state_travel, trip_rows, trip_days = state_travel.loc[matched], trip_rows[matched], trip_days[matched]
+
+    row_populations = np.array(state_travel["Population Staying at Home"] + state_travel["Population Not Staying at Home"], dtype=float)
+    jurisdiction_populations = np.full(len(jurisdictions), np.nan)
+    _, earliest = np.unique(trip_rows, return_index=True)
+    jurisdiction_populations[trip_rows[earliest]] = row_populations[earliest]
+
+    panel_y = np.full((len(jurisdictions), len(panel_dates), len(target_labels)), np.nan)
+    for k, target_label in enumerate(target_labels):
+        panel_y[trip_rows, trip_days, k] = np.array(travel_target(state_travel, target_label,
+                                                                  jurisdiction_populations[trip_rows]))
+    return panel_dates, jurisdictions, jurisdiction_codes, panel_y, panel_doses, jurisdiction_populations
+
+
+def first_dose(state_name, state_code, target_label, start_date="2020-12-01", end_date="2021-04-26"):
     '''
     Given a state, find the number of first doses allocated to that state
-    on each day starting with December 1st, 2020.
+    on each day of the window, by default starting with December 1st, 2020.
     
     Parameters
     ----------
@@ -165,6 +392,7 @@ def first_dose(state_name, state_code, target_label):
         Short corresponding to fractional population not staying home on a given
         day and the fractions of long (>100 miles), medium (10-100 miles), and
         short (<10 miles) trips in Georgia on a given day.
+    - start_date, end_date : inclusive bounds of the extraction window
     Returns
     -------
     - state_alloc_dates : the date corresponding to each datum
@@ -172,64 +400,15 @@ def first_dose(state_name, state_code, target_label):
     - state_dose_nums : instantaneous first doses of each vaccine allocated to
         the state on each day
     '''
-    trips = pd.read_csv("data/Trips_by_Distance.csv")
-
-    pfizer = pd.read_csv("data/COVID-19_Vaccine_Distribution_Allocations_by_Jurisdiction_-_Pfizer.csv")
-    moderna = pd.read_csv("data/COVID-19_Vaccine_Distribution_Allocations_by_Jurisdiction_-_Moderna.csv")
-    janssen = pd.read_csv("data/COVID-19_Vaccine_Distribution_Allocations_by_Jurisdiction_-_Janssen.csv")
-
-    trip_indices = np.array(trips["State Postal Code"] == state_code)
-    trip_indices = np.logical_and(trip_indices, np.array(pd.to_datetime(trips["Date"]) >= "2020-12-01"))
-    trip_indices = np.logical_and(trip_indices, np.array(pd.to_datetime(trips["Date"]) <= "2021-04-26"))
-    state_travel = trips.loc[trip_indices].reset_index()
-    trip_indices = np.where(pd.isnull(state_travel["County Name"]))
-    state_travel = state_travel.loc[trip_indices]
-    
-    state_population = (state_travel["Population Staying at Home"] + state_travel["Population Not Staying at Home"]).iloc[0]
-    state_trip_dates = pd.to_datetime(state_travel["Date"])
-
-    if target_label == "Population":
-        state_travelers = state_travel["Population Not Staying at Home"]
-        state_y = state_travelers/state_population
-    elif target_label == "Long":
-        state_long_trips = state_travel["Number of Trips 100-250"] + state_travel["Number of Trips 250-500"] + state_travel["Number of Trips >=500"]
-        state_y = state_long_trips/state_travel["Number of Trips"]
-    elif target_label == "Medium":
-        state_med_trips = state_travel["Number of Trips 10-25"] + state_travel["Number of Trips 25-50"] + state_travel["Number of Trips 50-100"]
-        state_y = state_med_trips/state_travel["Number of Trips"]
-    elif target_label == "Short":
-        state_short_trips = state_travel["Number of Trips <1"] + state_travel["Number of Trips 1-3"] + state_travel["Number of Trips 3-5"] + state_travel["Number of Trips 5-10"]
-        state_y = state_short_trips/state_travel["Number of Trips"]
-
-    state_pfizer = pfizer.loc[pfizer["Jurisdiction"] == state_name].reset_index(drop=True)
-    state_moderna = moderna.loc[moderna["Jurisdiction"] == state_name].reset_index(drop=True)
-    state_janssen = janssen.loc[janssen["Jurisdiction"] == state_name].reset_index(drop=True)
-
-    all_dates = list(pd.to_datetime(state_travel["Date"]))
-    all_dates_str = []
-    for i in range(len(all_dates)):
-        all_dates_str.append(all_dates[i].strftime("%m/%d/%Y"))
-    state_first_dose = pd.DataFrame()
-    for i in range(len(all_dates)):
-        num_allocations = 0
-        if all_dates_str[i] in list(state_pfizer["Week of Allocations"]):
-            num_allocations += int(state_pfizer[state_pfizer["Week of Allocations"] == all_dates_str[i]]["1st Dose Allocations"])
-        if all_dates_str[i] in list(state_moderna["Week of Allocations"]):
-            num_allocations += int(state_moderna[state_moderna["Week of Allocations"] == all_dates_str[i]]["1st Dose Allocations"])
-        if all_dates_str[i] in list(state_janssen["Week of Allocations"]):
-            num_allocations += int(state_janssen[state_janssen["Week of Allocations"] == all_dates_str[i]]["1st Dose Allocations"])
-        state_first_dose = state_first_dose.append({"Week of Allocations":all_dates_str[i],
-                                                    "1st Dose Allocations":num_allocations},ignore_index=True)
-    state_alloc_dates = pd.to_datetime(state_first_dose["Week of Allocations"])
-    state_dose_nums = state_first_dose["1st Dose Allocations"]
-
-    return state_alloc_dates, state_y, state_dose_nums
-
-
-def second_dose(state_name, state_code, target_label):
+    state_alloc_dates, state_y, state_doses = vaccine_allocations(state_name, state_code, target_label,
+                                                                 start_date, end_date)
+    return state_alloc_dates, state_y, state_doses["1st Dose Allocations"]
+
+
+def second_dose(state_name, state_code, target_label, start_date="2020-12-01", end_date="2021-04-26"):
     '''
     Given a state, find the number of second doses allocated to that state
-    on each day starting with December 1st, 2020.
+    on each day of the window, by default starting with December 1st, 2020.
     
     Parameters
     ----------
@@ -240,6 +419,7 @@ def second_dose(state_name, state_code, target_label):
         Short corresponding to fractional population not staying home on a given
         day and the fractions of long (>100 miles), medium (10-100 miles), and
         short (<10 miles) trips in Georgia on a given day.
+    - start_date, end_date : inclusive bounds of the extraction window
     Returns
     -------
     - state_alloc_dates : the date corresponding to each datum
@@ -247,60 +427,15 @@ def second_dose(state_name, state_code, target_label):
     - state_dose_nums : instantaneous second doses of each vaccine allocated to
         the state on each day
     '''
-    trips = pd.read_csv("data/Trips_by_Distance.csv")
+    state_alloc_dates, state_y, state_doses = vaccine_allocations(state_name, state_code, target_label,
+                                                                 start_date, end_date)
+    return state_alloc_dates, state_y, state_doses["2nd Dose Allocations"]
 
-    pfizer = pd.read_csv("data/COVID-19_Vaccine_Distribution_Allocations_by_Jurisdiction_-_Pfizer.csv")
-    moderna = pd.read_csv("data/COVID-19_Vaccine_Distribution_Allocations_by_Jurisdiction_-_Moderna.csv")
 
-    trip_indices = np.array(trips["State Postal Code"] == state_code)
-    trip_indices = np.logical_and(trip_indices, np.array(pd.to_datetime(trips["Date"]) >= "2020-12-01"))
-    trip_indices = np.logical_and(trip_indices, np.array(pd.to_datetime(trips["Date"]) <= "2021-04-26"))
-    state_travel = trips.loc[trip_indices].reset_index()
-    trip_indices = np.where(pd.isnull(state_travel["County Name"]))
-    state_travel = state_travel.loc[trip_indices]
-    
-    state_population = (state_travel["Population Staying at Home"] + state_travel["Population Not Staying at Home"]).iloc[0]
-    state_trip_dates = pd.to_datetime(state_travel["Date"])
-
-    if target_label == "Population":
-        state_travelers = state_travel["Population Not Staying at Home"]
-        state_y = state_travelers/state_population
-    elif target_label == "Long":
-        state_long_trips = state_travel["Number of Trips 100-250"] + state_travel["Number of Trips 250-500"] + state_travel["Number of Trips >=500"]
-        state_y = state_long_trips/state_travel["Number of Trips"]
-    elif target_label == "Medium":
-        state_med_trips = state_travel["Number of Trips 10-25"] + state_travel["Number of Trips 25-50"] + state_travel["Number of Trips 50-100"]
-        state_y = state_med_trips/state_travel["Number of Trips"]
-    elif target_label == "Short":
-        state_short_trips = state_travel["Number of Trips <1"] + state_travel["Number of Trips 1-3"] + state_travel["Number of Trips 3-5"] + state_travel["Number of Trips 5-10"]
-        state_y = state_short_trips/state_travel["Number of Trips"]
-
-    state_pfizer = pfizer.loc[pfizer["Jurisdiction"] == state_name].reset_index(drop=True)
-    state_moderna = moderna.loc[moderna["Jurisdiction"] == state_name].reset_index(drop=True)
-
-    all_dates = list(pd.to_datetime(state_travel["Date"]))
-    all_dates_str = []
-    for i in range(len(all_dates)):
-        all_dates_str.append(all_dates[i].strftime("%m/%d/%Y"))
-    state_second_dose = pd.DataFrame()
-    for i in range(len(all_dates)):
-        num_allocations = 0
-        if all_dates_str[i] in list(state_pfizer["Week of Allocations"]):
-            num_allocations += int(state_pfizer[state_pfizer["Week of Allocations"] == all_dates_str[i]]["2nd Dose Allocations"])
-        if all_dates_str[i] in list(state_moderna["Week of Allocations"]):
-            num_allocations += int(state_moderna[state_moderna["Week of Allocations"] == all_dates_str[i]]["2nd Dose Allocations"])
-        state_second_dose = state_second_dose.append({"Week of Allocations":all_dates_str[i],
-                                                    "2nd Dose Allocations":num_allocations},ignore_index=True)
-    state_alloc_dates = pd.to_datetime(state_second_dose["Week of Allocations"])
-    state_dose_nums = state_second_dose["2nd Dose Allocations"]
-
-    return state_alloc_dates, state_y, state_dose_nums
-
-
-def cumul_doses(state_name, state_code, target_label):
+def cumul_doses(state_name, state_code, target_label, start_date="2020-12-01", end_date="2021-04-26"):
     '''
     Given a state, find the number of cumulative doses allocated to that state
-    on starting with December 1st, 2020.
+    on each day of the window, by default starting with December 1st, 2020.
     
     Parameters
     ----------
@@ -311,6 +446,7 @@ def cumul_doses(state_name, state_code, target_label):
         Short corresponding to fractional population not staying home on a given
         day and the fractions of long (>100 miles), medium (10-100 miles), and
         short (<10 miles) trips in Georgia on a given day.
+    - start_date, end_date : inclusive bounds of the extraction window
     Returns
     -------
     - state_alloc_dates : the date corresponding to each datum
@@ -318,58 +454,72 @@ def cumul_doses(state_name, state_code, target_label):
     - state_doses_cumul : cumulative doses of each vaccine allocated to
         the state on each day
     '''
-    trips = pd.read_csv("data/Trips_by_Distance.csv")
-
-    pfizer = pd.read_csv("data/COVID-19_Vaccine_Distribution_Allocations_by_Jurisdiction_-_Pfizer.csv")
-    moderna = pd.read_csv("data/COVID-19_Vaccine_Distribution_Allocations_by_Jurisdiction_-_Moderna.csv")
-    janssen = pd.read_csv("data/COVID-19_Vaccine_Distribution_Allocations_by_Jurisdiction_-_Janssen.csv")
-
-    trip_indices = np.array(trips["State Postal Code"] == state_code)
-    trip_indices = np.logical_and(trip_indices, np.array(pd.to_datetime(trips["Date"]) >= "2020-12-01"))
-    trip_indices = np.logical_and(trip_indices, np.array(pd.to_datetime(trips["Date"]) <= "2021-04-26"))
-    state_travel = trips.loc[trip_indices].reset_index()
-    trip_indices = np.where(pd.isnull(state_travel["County Name"]))
-    state_travel = state_travel.loc[trip_indices]
+    state_alloc_dates, state_y, state_doses = vaccine_allocations(state_name, state_code, target_label,
+                                                                 start_date, end_date)
+    return state_alloc_dates, state_y, state_doses["Cumulative Doses"].rename("Total Doses")
+
+
+def travel_target(travel, target_label, population=None):
+    '''
+    Compute a travel target from trips rows: the fraction of the population
+    not staying home, or the share of trips in a distance band.
     
-    state_population = (state_travel["Population Staying at Home"] + state_travel["Population Not Staying at Home"]).iloc[0]
-    state_trip_dates = pd.to_datetime(state_travel["Date"])
-
-    if target_label == "Population":
-        state_travelers = state_travel["Population Not Staying at Home"]
-        state_y = state_travelers/state_population
-    elif target_label == "Long":
-        state_long_trips = state_travel["Number of Trips 100-250"] + state_travel["Number of Trips 250-500"] + state_travel["Number of Trips >=500"]
-        state_y = state_long_trips/state_travel["Number of Trips"]
-    elif target_label == "Medium":
-        state_med_trips = state_travel["Number of Trips 10-25"] + state_travel["Number of Trips 25-50"] + state_travel["Number of Trips 50-100"]
-        state_y = state_med_trips/state_travel["Number of Trips"]
-    elif target_label == "Short":
-        state_short_trips = state_travel["Number of Trips <1"] + state_travel["Number of Trips 1-3"] + state_travel["Number of Trips 3-5"] + state_travel["Number of Trips 5-10"]
-        state_y = state_short_trips/state_travel["Number of Trips"]
-
-    state_pfizer = pfizer.loc[pfizer["Jurisdiction"] == state_name].reset_index(drop=True)
-    state_moderna = moderna.loc[moderna["Jurisdiction"] == state_name].reset_index(drop=True)
-    state_janssen = janssen.loc[janssen["Jurisdiction"] == state_name].reset_index(drop=True)
-
-    all_dates = list(pd.to_datetime(state_travel["Date"]))
-    all_dates_str = []
-    for i in range(len(all_dates)):
-        all_dates_str.append(all_dates[i].strftime("%m/%d/%Y"))
-    state_doses = pd.DataFrame()
-    for i in range(len(all_dates)):
-        num_allocations = 0
-        if all_dates_str[i] in list(state_pfizer["Week of Allocations"]):
-            num_allocations += int(state_pfizer[state_pfizer["Week of Allocations"] == all_dates_str[i]]["1st Dose Allocations"])
-            num_allocations += int(state_pfizer[state_pfizer["Week of Allocations"] == all_dates_str[i]]["2nd Dose Allocations"])
-        if all_dates_str[i] in list(state_moderna["Week of Allocations"]):
-            num_allocations += int(state_moderna[state_moderna["Week of Allocations"] == all_dates_str[i]]["1st Dose Allocations"])
-            num_allocations += int(state_moderna[state_moderna["Week of Allocations"] == all_dates_str[i]]["2nd Dose Allocations"])
-        if all_dates_str[i] in list(state_janssen["Week of Allocations"]):
-            num_allocations += int(state_janssen[state_janssen["Week of Allocations"] == all_dates_str[i]]["1st Dose Allocations"])
-        state_doses = state_doses.append({"Week of Allocations":all_dates_str[i],
-                                                    "Total Doses":num_allocations},ignore_index=True)
-    state_alloc_dates = pd.to_datetime(state_doses["Week of Allocations"])
-    state_dose_nums = state_doses["Total Doses"]
-    state_doses_cumul = state_dose_nums.cumsum()
-
-    return state_alloc_dates, state_y, state_doses_cumul
\ No newline at end of file
+    Parameters
+    ----------
+    - travel : DataFrame of Trips_by_Distance rows
+    - target_label : string specifying either the Population, Long, Medium, or
+        Short target as in county_extraction
+    - population : population for the Population target, either one number
+        or one per row; by default that of the first row
+    Returns
+    -------
+    - y : the target for every row of travel
+    '''
+    with stage("target computation"):
+        if target_label == "Population":
+            if population is None:
+                population = (travel["Population Staying at Home"] + travel["Population Not Staying at Home"]).iloc[0]
+            return travel["Population Not Staying at Home"]/population
+        elif target_label == "Long":
+            trips = travel["Number of Trips 100-250"] + travel["Number of Trips 250-500"] + travel["Number of Trips >=500"]
+        elif target_label == "Medium":
+            trips = travel["Number of Trips 10-25"] + travel["Number of Trips 25-50"] + travel["Number of Trips 50-100"]
+        elif target_label == "Short":
+            trips = travel["Number of Trips <1"] + travel["Number of Trips 1-3"] + travel["Number of Trips 3-5"] + travel["Number of Trips 5-10"]
+        else:
+            raise ValueError("unknown target_label {!r}".format(target_label))
+        return trips/travel["Number of Trips"]
+
+
+_allocation_tables = {}
+
+
+def _date_string(date):
+    # the epicurve report dates are compared as "YYYY-MM-DD" strings
+    return pd.Timestamp(date).strftime("%Y-%m-%d")
+
+
+def _case_rows(epicurve_report_date, region, start_date, end_date):
+    # the epicurve rows of one region within the window, in file order
+    case_indices = np.logical_and(np.array(epicurve_report_date["county"] == region), np.array(epicurve_report_date["report_date"] <= _date_string(end_date)))
+    case_indices = np.logical_and(case_indices, np.array(epicurve_report_date["report_date"] >= _date_string(start_date)))
+    return epicurve_report_date.loc[case_indices].reset_index()
+
+
+def _allocation_table(file_name):
+    # doses per (jurisdiction, allocation date), parsed once per loaded source
+    source = read_source(file_name)
+    cached = _allocation_tables.get(file_name)
+    if cached is not None and cached[0] is source:
+        return cached[1]
+    allocations = pd.DataFrame({
+        "Jurisdiction": source["Jurisdiction"],
+        "Week of Allocations": pd.to_datetime(source["Week of Allocations"], format="%m/%d/%Y"),
+        "1st Dose Allocations": source["1st Dose Allocations"].fillna(0).astype(np.int64)})
+    if "2nd Dose Allocations" in source.columns:
+        allocations["2nd Dose Allocations"] = source["2nd Dose Allocations"].fillna(0).astype(np.int64)
+    else:
+        allocations["2nd Dose Allocations"] = 0
+    allocations = allocations.groupby(["Jurisdiction", "Week of Allocations"]).sum()
+    _allocation_tables[file_name] = (source, allocations)
+    return allocations
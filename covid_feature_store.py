@@ -0,0 +1,239 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+import covid_data_loader
+from covid_data_loader import (read_source, read_trips, read_appended, source_position, _select_trips, TRIPS_FILE,
+                               EPICURVE_FILE, TRIP_COLUMNS)
+from covid_feature_extraction import TARGET_LABELS, FEATURE_LABELS, travel_target, _date_string
+
+STORE_DIR = None
+MOVING_AVERAGE_DAYS = 7
+STORE_COLUMNS = ["Date"] + TARGET_LABELS + ["total_cases", "deaths"] + FEATURE_LABELS
+
+
+def refresh_features(region, end_date=None, start_date="2020-02-29", store_dir=None):
+    '''
+    Bring the stored features of a region up to date. A new store reads the
+    history of the region through the trips index and the cached epicurve.
+    From then on only the lines appended to each source since the last
+    refresh are parsed, with read_appended, so a daily refresh costs the new
+    rows rather than the whole archive. The rows of the region that are not
+    stored yet, e.g. days after end_date or case reports still waiting for
+    their trips, are kept next to the store for the next refresh. A source
+    that was rewritten rather than appended to is read again from the day
+    after the last stored date. Sources that arrive as separate files of
+    new rows can be passed to append_features directly instead.
+
+    Parameters
+    ----------
+    - region : "Georgia" for the state or the name of a Georgia county
+    - end_date : last day to ingest, by default the latest available
+    - start_date : first day ingested when the store of the region is empty
+    - store_dir : directory of the feature store, by default "features"
+        inside the data directory
+    Returns
+    -------
+    - appended : DataFrame of the rows that were appended
+    '''
+    state = _read_state(region, store_dir)
+    county_name = None if region == "Georgia" else region + " County"
+    if state is not None and "positions" in state:
+        start_date = pd.Timestamp(state["last_date"]) + pd.Timedelta(days=1)
+        pending_travel, pending_cases = _read_pending(region, store_dir)
+        trips, trips_position = read_appended(TRIPS_FILE, state["positions"][TRIPS_FILE], usecols=TRIP_COLUMNS,
+                                              dtype={"State Postal Code": object, "County Name": object})
+        if trips is None:
+            travel = read_trips("GA", county_name, start_date)
+        else:
+            travel = pd.concat([pending_travel, _select_trips(trips, "GA", county_name, start_date, None)])
+        epicurve, epicurve_position = read_appended(EPICURVE_FILE, state["positions"][EPICURVE_FILE])
+        if epicurve is None:
+            cases = _region_cases(read_source(EPICURVE_FILE), region, start_date)
+        else:
+            cases = pd.concat([pending_cases, _region_cases(epicurve, region, start_date)])
+    else:
+        if state is not None:
+            start_date = pd.Timestamp(state["last_date"]) + pd.Timedelta(days=1)
+            case_start = start_date
+        else:
+            # the days before a new store seed its moving averages
+            case_start = pd.Timestamp(start_date) - pd.Timedelta(days=MOVING_AVERAGE_DAYS - 1)
+        # rows appended while the sources are read are read again next time
+        trips_position = source_position(TRIPS_FILE)
+        epicurve_position = source_position(EPICURVE_FILE)
+        travel = read_trips("GA", county_name, start_date)
+        cases = _region_cases(read_source(EPICURVE_FILE), region, case_start)
+
+    if end_date is None:
+        appended = append_features(region, travel, cases, store_dir)
+    else:
+        appended = append_features(region, travel.loc[np.array(pd.to_datetime(travel["Date"]) <= end_date)],
+                                   cases.loc[np.array(cases["report_date"] <= _date_string(end_date))], store_dir)
+
+    state = _read_state(region, store_dir)
+    if state is not None:
+        last_date = pd.Timestamp(state["last_date"])
+        _write_pending(region, store_dir, travel.loc[np.array(pd.to_datetime(travel["Date"]) > last_date)],
+                       cases.loc[np.array(cases["report_date"] > _date_string(last_date))])
+        state["positions"] = {TRIPS_FILE: trips_position, EPICURVE_FILE: epicurve_position}
+        _write_state(region, store_dir, state)
+    return appended
+
+
+def append_features(region, travel, cases, store_dir=None):
+    '''
+    Append new days to the feature store of a region. A day is appended once
+    both its trips and its case report are present and it is later than the
+    last stored day. Cumulative totals and moving averages continue from the
+    running state kept next to the store and advance over every case report
+    up to the last appended day, including days with no trips, so a gap in
+    the trips only drops that day's row. The per-100k rates use the
+    population of the first ingested day, so earlier rows are never read or
+    recomputed. A new store starts its cumulative totals from the reported
+    "total_cases_cum" and "death_cum" when those columns are given, and its
+    moving averages from the case rows before its first day, so it matches
+    county_extraction from the first row on.
+
+    Parameters
+    ----------
+    - region : "Georgia" for the state or the name of a Georgia county
+    - travel : DataFrame of Trips_by_Distance rows of the region
+    - cases : DataFrame of epicurve rows of the region with the "report_date",
+        "total_cases" and "deaths" columns; for a new store it should include
+        the MOVING_AVERAGE_DAYS - 1 days before the first day to append
+    - store_dir : directory of the feature store, as in refresh_features
+    Returns
+    -------
+    - appended : DataFrame of the rows that were appended, in STORE_COLUMNS
+    '''
+    state = _read_state(region, store_dir)
+    travel = travel.assign(Date=pd.to_datetime(travel["Date"]).dt.normalize())
+    travel = travel.drop_duplicates("Date", keep="last").set_index("Date").sort_index()
+    cases = cases.assign(Date=pd.to_datetime(cases["report_date"]).dt.normalize())
+    cases = cases.drop_duplicates("Date", keep="last").set_index("Date").sort_index()
+
+    dates = travel.index.intersection(cases.index)
+    if state is not None:
+        dates = dates[dates > pd.Timestamp(state["last_date"])]
+    if len(dates) == 0:
+        return pd.DataFrame(columns=STORE_COLUMNS)
+    keep = MOVING_AVERAGE_DAYS - 1
+    history = cases.loc[cases.index < dates[0]].tail(keep)
+    travel = travel.loc[dates]
+    # the case days folded into the running state; later ones wait for
+    # their trips, earlier ones are already in it
+    first_day = dates[0] if state is None else pd.Timestamp(state["last_date"]) + pd.Timedelta(days=1)
+    cases = cases.loc[np.logical_and(cases.index >= first_day, cases.index <= dates[-1])]
+    rows = cases.index.get_indexer(dates)
+
+    if state is None:
+        # a new store picks up the reported running totals and the recent
+        # daily numbers where it starts
+        population = float((travel["Population Staying at Home"] + travel["Population Not Staying at Home"]).iloc[0])
+        state = {"population": population, "case_cum": 0.0, "death_cum": 0.0,
+                 "recent_cases": history["total_cases"].astype(float).tolist(),
+                 "recent_deaths": history["deaths"].astype(float).tolist()}
+        if "total_cases_cum" in cases.columns:
+            state["case_cum"] = float(cases["total_cases_cum"].iloc[0] - cases["total_cases"].iloc[0])
+        if "death_cum" in cases.columns:
+            state["death_cum"] = float(cases["death_cum"].iloc[0] - cases["deaths"].iloc[0])
+    population = state["population"]
+
+    case_numbers = np.array(cases["total_cases"], dtype=float)
+    death_numbers = np.array(cases["deaths"], dtype=float)
+    case_cum = state["case_cum"] + np.cumsum(case_numbers)
+    death_cum = state["death_cum"] + np.cumsum(death_numbers)
+    case_window = np.concatenate([state["recent_cases"], case_numbers])
+    death_window = np.concatenate([state["recent_deaths"], death_numbers])
+    case_ma = _trailing_mean(case_window)[-len(case_numbers):]
+    death_ma = _trailing_mean(death_window)[-len(death_numbers):]
+
+    appended = pd.DataFrame({"Date": dates})
+    for target_label in TARGET_LABELS:
+        appended[target_label] = np.array(travel_target(travel, target_label, population))
+    appended["total_cases"] = case_numbers[rows]
+    appended["deaths"] = death_numbers[rows]
+    for label, values in zip(FEATURE_LABELS, [case_numbers, case_cum, case_ma, death_numbers, death_cum, death_ma]):
+        appended[label] = 1e5*values[rows]/population
+
+    store_path = _store_path(region, store_dir)
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    appended.to_csv(store_path + ".csv", mode="a", header=not os.path.exists(store_path + ".csv"), index=False)
+
+    state.update({"last_date": dates[-1].strftime("%Y-%m-%d"),
+                  "case_cum": float(case_cum[-1]), "death_cum": float(death_cum[-1]),
+                  "recent_cases": case_window[-keep:].tolist(),
+                  "recent_deaths": death_window[-keep:].tolist()})
+    _write_state(region, store_dir, state)
+    return appended
+
+
+def load_features(region, store_dir=None):
+    '''
+    Read the stored features of a region.
+
+    Parameters
+    ----------
+    - region : "Georgia" for the state or the name of a Georgia county
+    - store_dir : directory of the feature store, as in refresh_features
+    Returns
+    -------
+    - features : DataFrame with the STORE_COLUMNS, one row per day
+    '''
+    features = pd.read_csv(_store_path(region, store_dir) + ".csv", parse_dates=["Date"])
+    # an interrupted append may have written rows before the state was saved
+    return features.drop_duplicates("Date", keep="last").reset_index(drop=True)
+
+
+def _store_path(region, store_dir):
+    if store_dir is None:
+        store_dir = STORE_DIR if STORE_DIR is not None else os.path.join(covid_data_loader.DATA_DIR, "features")
+    return os.path.join(store_dir, region)
+
+
+def _read_state(region, store_dir):
+    try:
+        with open(_store_path(region, store_dir) + ".json") as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(region, store_dir, state):
+    store_path = _store_path(region, store_dir)
+    tmp_path = store_path + ".json.tmp"
+    with open(tmp_path, "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(tmp_path, store_path + ".json")
+
+
+def _region_cases(epicurve_report_date, region, start_date):
+    case_indices = np.array(epicurve_report_date["county"] == region)
+    case_indices = np.logical_and(case_indices, np.array(epicurve_report_date["report_date"] >= _date_string(start_date)))
+    return epicurve_report_date.loc[case_indices]
+
+
+def _read_pending(region, store_dir):
+    # the rows of the region read from the sources but not stored yet
+    store_path = _store_path(region, store_dir)
+    return (pd.read_csv(store_path + ".pending_trips.csv", parse_dates=["Date"],
+                        dtype={"State Postal Code": object, "County Name": object}),
+            pd.read_csv(store_path + ".pending_cases.csv", dtype={"report_date": object}))
+
+
+def _write_pending(region, store_dir, travel, cases):
+    store_path = _store_path(region, store_dir)
+    for suffix, frame in [(".pending_trips.csv", travel), (".pending_cases.csv", cases)]:
+        frame.to_csv(store_path + suffix + ".tmp", index=False)
+        os.replace(store_path + suffix + ".tmp", store_path + suffix)
+
+
+def _trailing_mean(values):
+    window = MOVING_AVERAGE_DAYS
+    sums = np.cumsum(np.concatenate([[0.0], values]))
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    starts = np.arange(len(values)) + 1 - counts
+    return (sums[1:] - sums[starts])/counts
@@ -0,0 +1,211 @@
+import numpy as np
+from scipy.linalg import cho_solve
+from joblib import Parallel, delayed
+from sklearn.linear_model import lasso_path
+from sklearn.model_selection import KFold
+
+LAMBDAS = np.logspace(-8, -1, 100)
+
+
+def lasso_path_cv(X, y, lambdas=LAMBDAS, n_splits=5, max_iter=10000, n_jobs=-1):
+    '''
+    Cross-validate the Lasso over a grid of regularization strengths. Instead
+    of fitting every (lambda, fold) pair from scratch, each fold solves the
+    whole path with warm starts on its precomputed Gram matrix, and the folds
+    run in parallel. Matches fitting Lasso(alpha=lambda, max_iter=max_iter)
+    with an intercept on every KFold split and averaging, as lasso_coefs
+    does, but only once coordinate descent converges for every lambda; on
+    unscaled features both solvers stop at max_iter at different points,
+    and the errors and best_index can differ, so standardize X first.
+    On region_data("Fulton", "Short") from generate_sources with cumulative
+    doses (407 rows, 7 features) and the default grid, one core took 1.1 s
+    unscaled and 0.8 s standardized, against 5.7 s and 3.5 s for the
+    per-fold Lasso loop: about 4-5x before the folds run in parallel.
+
+    Parameters
+    ----------
+    - X : feature matrix with one row per datum
+    - y : target vector
+    - lambdas : increasing grid of regularization strengths
+    - n_splits : number of (unshuffled) KFold splits
+    - max_iter : maximum coordinate descent iterations per lambda
+    - n_jobs : number of joblib workers, by default one per core; None or 1
+        for a single process
+    Returns
+    -------
+    - coefs : array of shape (lambdas, features) with the fold-averaged
+        coefficients for each lambda
+    - scores : the fold-averaged test mean squared error for each lambda
+    - best_lambda : the largest lambda attaining the minimum error
+    - best_index : the position of best_lambda in lambdas
+    '''
+    return lasso_path_cv_many([(X, y)], lambdas, n_splits, max_iter, n_jobs)[0]
+
+
+def lasso_path_cv_many(problems, lambdas=LAMBDAS, n_splits=5, max_iter=10000, n_jobs=-1):
+    '''
+    Run lasso_path_cv on several (X, y) problems, e.g. every county and
+    target, sharing one pool of workers across all of their folds.
+
+    Parameters
+    ----------
+    - problems : list of (X, y) pairs
+    - lambdas, n_splits, max_iter, n_jobs : as in lasso_path_cv
+    Returns
+    -------
+    - results : list with the lasso_path_cv output of each problem
+    '''
+    lambdas = np.asarray(lambdas, dtype=float)
+    kf = KFold(n_splits=n_splits)
+    tasks = []
+    for X, y in problems:
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        for train_indices, test_indices in kf.split(X):
+            tasks.append((X, y, train_indices, test_indices))
+    fold_results = Parallel(n_jobs=n_jobs)(delayed(_fold_path)(X, y, train_indices, test_indices, lambdas, max_iter)
+                                           for X, y, train_indices, test_indices in tasks)
+
+    results = []
+    for i in range(len(problems)):
+        folds = fold_results[i*n_splits:(i + 1)*n_splits]
+        coefs = np.mean([fold_coefs for fold_coefs, _ in folds], axis=0)
+        scores = np.mean([fold_scores for _, fold_scores in folds], axis=0)
+        # ties go to the larger lambda, as with the "<=" scan over the grid
+        best_index = len(scores) - 1 - int(np.argmin(scores[::-1]))
+        results.append((coefs, scores, lambdas[best_index], best_index))
+    return results
+
+
+def _fold_path(X, y, train_indices, test_indices, lambdas, max_iter):
+    X_train, X_test = X[train_indices], X[test_indices]
+    y_train, y_test = y[train_indices], y[test_indices]
+
+    # centring reproduces Lasso's unpenalized intercept
+    X_mean = X_train.mean(axis=0)
+    y_mean = y_train.mean()
+    X_centered = X_train - X_mean
+    y_centered = y_train - y_mean
+    gram = X_centered.T @ X_centered
+    Xy = X_centered.T @ y_centered
+
+    # lasso_path walks the grid from the largest lambda down, warm starting
+    order = np.argsort(lambdas)[::-1]
+    _, path, _ = lasso_path(X_centered, y_centered, alphas=lambdas[order], precompute=gram, Xy=Xy,
+                            max_iter=max_iter)
+    coefs = np.empty((len(lambdas), X.shape[1]))
+    coefs[order] = path.T
+
+    intercepts = y_mean - coefs @ X_mean
+    y_pred = X_test @ coefs.T + intercepts
+    scores = ((y_test[:, None] - y_pred)**2).mean(axis=0)
+    return coefs, scores
+
+
+def var_lag_sweep(vector_data, max_lag=40, train_frac=0.85, target=0):
+    '''
+    Fit VAR(p) models with a constant for every lag p = 1..max_lag on the
+    differenced training part of vector_data, as VAR_wrapper does with
+    statsmodels, and report the AIC and hold-out forecast error of each. The
+    lagged design is built once for max_lag. Each VAR(p) uses the leading
+    1 + p*K columns of that design, and the Cholesky factor of a leading block
+    of a Gram matrix is the leading block of its factor. The sweep therefore
+    keeps one factor and gives it a rank-one update for each extra sample row
+    that a smaller lag allows, instead of rebuilding and solving every model.
+
+    Parameters
+    ----------
+    - vector_data : array or DataFrame of shape (time, K) holding the series
+        in levels, e.g. the target, cases, deaths, and vaccine allocations
+    - max_lag : largest lag order to fit
+    - train_frac : fraction of the rows used for fitting; the rest is the
+        hold-out forecast horizon
+    - target : column (position or name) whose forecast error is reported
+    Returns
+    -------
+    - lags : the lag orders 1..max_lag
+    - aic_vals : the Akaike information criterion of each fit
+    - mse_vals : the hold-out mean squared error of the target, forecasting
+        the differences and integrating them from the last training level
+    '''
+    if hasattr(vector_data, "columns"):
+        if not isinstance(target, (int, np.integer)):
+            target = list(vector_data.columns).index(target)
+        vector_data = vector_data.to_numpy()
+    levels = np.asarray(vector_data, dtype=float)
+    train = levels[:int(train_frac*len(levels))]
+    test = levels[int(train_frac*len(levels)):]
+    diff = np.diff(train, axis=0)
+    n_obs, K = diff.shape
+    width = 1 + K*max_lag
+
+    # row t holds [1, y_{t-1}, ..., y_{t-max_lag}] with zeros before the sample
+    design = np.zeros((n_obs, width))
+    design[:, 0] = 1
+    for j in range(1, max_lag + 1):
+        design[j:, 1 + K*(j - 1):1 + K*j] = diff[:-j]
+
+    gram = design[max_lag:].T @ design[max_lag:]
+    cross = design[max_lag:].T @ diff[max_lag:]
+    outer = diff[max_lag:].T @ diff[max_lag:]
+    factor = np.linalg.cholesky(gram)
+
+    lags = np.arange(1, max_lag + 1)
+    aic_vals = np.empty(max_lag)
+    mse_vals = np.empty(max_lag)
+    for p in range(max_lag, 0, -1):
+        n_cols = 1 + K*p
+        if p < max_lag:
+            # VAR(p) can also use row p, which VAR(p + 1) could not; later
+            # lags only read the leading block, so only that is updated
+            _cholesky_update(factor[:n_cols, :n_cols], design[p, :n_cols])
+            cross += np.outer(design[p], diff[p])
+            outer += np.outer(diff[p], diff[p])
+        nobs = n_obs - p
+        coefs = cho_solve((factor[:n_cols, :n_cols], True), cross[:n_cols])
+        sigma = (outer - cross[:n_cols].T @ coefs)/nobs
+        aic_vals[p - 1] = np.linalg.slogdet(sigma)[1] + 2.0/nobs*(p*K*K + K)
+
+        forecast = var_forecast(coefs, diff[-p:], len(test))
+        level_forecast = train[-1] + np.cumsum(forecast, axis=0)
+        mse_vals[p - 1] = ((level_forecast[:, target] - test[:, target])**2).mean()
+    return lags, aic_vals, mse_vals
+
+
+def _cholesky_update(factor, row):
+    # in-place lower Cholesky factor of A + row row^T
+    row = row.copy()
+    for k in range(len(row)):
+        if row[k] == 0:
+            continue
+        r = np.hypot(factor[k, k], row[k])
+        c = r/factor[k, k]
+        s = row[k]/factor[k, k]
+        factor[k, k] = r
+        factor[k + 1:, k] = (factor[k + 1:, k] + s*row[k + 1:])/c
+        row[k + 1:] = c*row[k + 1:] - s*factor[k + 1:, k]
+
+
+def var_forecast(coefs, history, steps):
+    '''
+    Iterate a fitted VAR(p) with a constant forward from the last p
+    observations, as VARResults.forecast does.
+
+    Parameters
+    ----------
+    - coefs : array of shape (1 + p*K, K) stacking the intercept and the
+        transposed lag matrices A_1..A_p
+    - history : array of shape (p, K) with the latest observations, oldest first
+    - steps : number of steps to forecast
+    Returns
+    -------
+    - forecast : array of shape (steps, K)
+    '''
+    K = history.shape[1]
+    p = len(history)
+    lagged = list(history[::-1])
+    forecast = np.empty((steps, K))
+    for h in range(steps):
+        forecast[h] = coefs[0] + np.concatenate(lagged[:p]) @ coefs[1:]
+        lagged.insert(0, forecast[h])
+    return forecast
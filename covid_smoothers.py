@@ -0,0 +1,203 @@
+import numpy as np
+from scipy.interpolate import RBFInterpolator
+
+CHUNK_SIZE = 20000
+SMOOTHINGS = np.logspace(-6, 1, 50)
+
+KERNELS = {"multiquadric": lambda r, epsilon: np.sqrt((r/epsilon)**2 + 1),
+           "gaussian": lambda r, epsilon: np.exp(-(r/epsilon)**2),
+           "linear": lambda r, epsilon: r}
+
+
+def panel_rows(panel_X, panel_y):
+    '''
+    Pool a (region, date, feature) panel, e.g. from county_panel, into one
+    row per (region, date), dropping the rows with a missing value.
+
+    Parameters
+    ----------
+    - panel_X : array of shape (region, date, feature)
+    - panel_y : array of shape (region, date) with a single target
+    Returns
+    -------
+    - X : array of shape (rows, feature)
+    - y : array of shape (rows,)
+    '''
+    X = np.asarray(panel_X, dtype=float).reshape(-1, panel_X.shape[-1])
+    y = np.asarray(panel_y, dtype=float).reshape(-1)
+    keep = np.logical_and(np.isfinite(X).all(axis=1), np.isfinite(y))
+    return X[keep], y[keep]
+
+
+def fit_rbf(X, y, n_centers=500, epsilon=1.0, smoothing=1e-3, kernel="multiquadric", seed=0):
+    '''
+    Fit a low-rank radial basis function regression. Instead of one basis
+    function per datum as in interpolate.Rbf, n_centers rows are drawn as
+    centres and the weights solve the ridge problem
+    (Phi^T Phi + smoothing I) w = Phi^T y. Phi is never formed in full; its
+    Gram matrix is accumulated over chunks of CHUNK_SIZE rows, so the cost is
+    O(n m^2) time and O(CHUNK_SIZE m + m^2) memory for n rows and m centres.
+    Features are divided by their largest absolute value, as in
+    multi_spline_wrapper.
+
+    Parameters
+    ----------
+    - X : feature matrix with one row per datum
+    - y : target vector
+    - n_centers : number of basis functions
+    - epsilon : shape parameter of the kernel
+    - smoothing : ridge penalty on the weights
+    - kernel : one of the KERNELS
+    - seed : seed of the centre selection
+    Returns
+    -------
+    - model : dict with the centres, weights and settings, for predict_rbf
+    '''
+    X, y = _as_features(X), np.asarray(y, dtype=float)
+    model = _rbf_basis(X, n_centers, epsilon, kernel, seed)
+    gram, moment = _accumulate(model, X, y)
+    m = len(model["centers"])
+    model["weights"] = np.linalg.solve(gram + smoothing*np.eye(m), moment)
+    return model
+
+
+def predict_rbf(model, X):
+    '''
+    Evaluate a fit_rbf model chunk by chunk.
+
+    Parameters
+    ----------
+    - model : dict returned by fit_rbf
+    - X : feature matrix with one row per datum
+    Returns
+    -------
+    - y_pred : the predicted target of every row
+    '''
+    X = _as_features(X)
+    y_pred = np.empty(len(X))
+    for start in range(0, len(X), CHUNK_SIZE):
+        y_pred[start:start + CHUNK_SIZE] = _design(model, X[start:start + CHUNK_SIZE]) @ model["weights"]
+    return y_pred
+
+
+def local_rbf(X, y, X_eval, neighbors=64, epsilon=1.0, interpolation_smoothing=1e-3, kernel="multiquadric"):
+    '''
+    Neighbour-limited RBF interpolation: every evaluation point uses only its
+    nearest training rows, found with a k-d tree. Evaluation runs in chunks
+    of CHUNK_SIZE points so memory stays bounded on pooled panels. Features
+    are scaled and the kernel is applied to r/epsilon as in fit_rbf, so the
+    same epsilon and kernel give the same basis functions.
+
+    Parameters
+    ----------
+    - X : feature matrix of the training rows
+    - y : training target vector
+    - X_eval : feature matrix of the rows to evaluate
+    - neighbors : number of nearest training rows per evaluation point
+    - epsilon : shape parameter of the kernel, as in fit_rbf
+    - interpolation_smoothing : added to the diagonal of each neighbourhood's
+        kernel matrix, as smoothing in scipy.interpolate.RBFInterpolator;
+        unlike the smoothing of fit_rbf it is not a ridge penalty
+    - kernel : one of the KERNELS
+    Returns
+    -------
+    - y_pred : the interpolated target of every row of X_eval
+    '''
+    X, X_eval = _as_features(X), _as_features(X_eval)
+    scale = _feature_scale(X)
+    # RBFInterpolator applies the kernel to epsilon*r, KERNELS to r/epsilon
+    interpolator = RBFInterpolator(X/scale, np.asarray(y, dtype=float), neighbors=min(neighbors, len(X)),
+                                   smoothing=interpolation_smoothing, kernel=kernel, epsilon=1/epsilon)
+    y_pred = np.empty(len(X_eval))
+    for start in range(0, len(X_eval), CHUNK_SIZE):
+        y_pred[start:start + CHUNK_SIZE] = interpolator(X_eval[start:start + CHUNK_SIZE]/scale)
+    return y_pred
+
+
+def rbf_smoothing_sweep(X, y, smoothings=SMOOTHINGS, n_splits=5, n_centers=500, epsilon=1.0,
+                        kernel="multiquadric", seed=0):
+    '''
+    Cross-validate fit_rbf over a whole grid of smoothing values at once.
+    Each fold draws its centres and feature scaling from its training rows
+    only, as fit_rbf on those rows would, so no held-out row shapes the
+    basis, as with the training-fold maxima of multi_spline_wrapper. Since
+    the folds partition the rows, a basis shared by all of them would have
+    to come from some fold's held-out rows, so the folds share no work;
+    only the smoothing values do. Within a fold, the Gram matrix is
+    accumulated in one chunked pass, and a single eigendecomposition then
+    gives the weights for every smoothing value in one product, which a
+    chunked pass over the test rows scores. Used on a single feature, this
+    replaces the per-fold UnivariateSpline refits of spline_wrapper for
+    every hand-tuned smoothing value.
+
+    Parameters
+    ----------
+    - X : feature matrix with one row per datum
+    - y : target vector
+    - smoothings : grid of ridge penalties
+    - n_splits : number of contiguous (unshuffled) folds, as KFold
+    - n_centers, epsilon, kernel, seed : as in fit_rbf
+    Returns
+    -------
+    - scores : the fold-averaged test mean squared error for each smoothing
+    - best_smoothing : the smoothing with the lowest error
+    '''
+    X, y = _as_features(X), np.asarray(y, dtype=float)
+    smoothings = np.asarray(smoothings, dtype=float)
+
+    fold_scores = []
+    for test_indices in np.array_split(np.arange(len(X)), n_splits):
+        train = np.ones(len(X), dtype=bool)
+        train[test_indices] = False
+        X_train, y_train = X[train], y[train]
+        model = _rbf_basis(X_train, n_centers, epsilon, kernel, seed)
+        gram, moment = _accumulate(model, X_train, y_train)
+        eigenvalues, eigenvectors = np.linalg.eigh(gram)
+        projected = eigenvectors.T @ moment
+        weights = eigenvectors @ (projected[:, None]/(eigenvalues[:, None] + smoothings))
+
+        squared_errors = np.zeros(len(smoothings))
+        for start in range(0, len(test_indices), CHUNK_SIZE):
+            rows = test_indices[start:start + CHUNK_SIZE]
+            residuals = _design(model, X[rows]) @ weights - y[rows, None]
+            squared_errors += (residuals**2).sum(axis=0)
+        fold_scores.append(squared_errors/len(test_indices))
+    scores = np.mean(fold_scores, axis=0)
+    return scores, smoothings[int(np.argmin(scores))]
+
+
+def _as_features(X):
+    X = np.asarray(X, dtype=float)
+    return X.reshape(len(X), -1)
+
+
+def _feature_scale(X):
+    scale = np.abs(X).max(axis=0)
+    scale[scale == 0] = 1
+    return scale
+
+
+def _rbf_basis(X, n_centers, epsilon, kernel, seed):
+    scale = _feature_scale(X)
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(X), size=min(n_centers, len(X)), replace=False))
+    return {"centers": X[rows]/scale, "scale": scale, "epsilon": epsilon, "kernel": kernel}
+
+
+def _design(model, X):
+    scaled = X/model["scale"]
+    centers = model["centers"]
+    squared = (scaled**2).sum(axis=1)[:, None] + (centers**2).sum(axis=1)[None, :] - 2*scaled @ centers.T
+    return KERNELS[model["kernel"]](np.sqrt(np.maximum(squared, 0)), model["epsilon"])
+
+
+def _accumulate(model, X, y):
+    # Phi^T Phi and Phi^T y, one chunk of rows at a time
+    m = len(model["centers"])
+    gram = np.zeros((m, m))
+    moment = np.zeros(m)
+    for start in range(0, len(X), CHUNK_SIZE):
+        design = _design(model, X[start:start + CHUNK_SIZE])
+        gram += design.T @ design
+        moment += design.T @ y[start:start + CHUNK_SIZE]
+    return gram, moment
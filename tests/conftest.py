@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# the modules live at the repository root, which plain pytest does not import from
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import covid_data_loader
+from covid_benchmark import generate_sources
+
+
+@pytest.fixture
+def source_options():
+    # generate_sources arguments of data_dir; override in a module, or
+    # parametrize with indirect=True, to generate other sources
+    return {}
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch, source_options):
+    # synthetic sources in tmp_path, read through a cache of their own
+    generate_sources(str(tmp_path), **source_options)
+    monkeypatch.setattr(covid_data_loader, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(covid_data_loader, "CACHE_DIR", str(tmp_path / ".cache"))
+    covid_data_loader.clear_cache()
+    yield tmp_path
+    covid_data_loader.clear_cache()
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+from statsmodels.tsa.api import VAR
+
+from covid_backtest import walk_forward_backtest
+
+
+def _levels(n_rows, first_delivery, seed=0):
+    # a trending target and cases, and allocations that stay zero until
+    # first_delivery, so their lagged columns start out all zero
+    rng = np.random.default_rng(seed)
+    levels = np.cumsum(rng.normal(0.05, 1.0, size=(n_rows, 3)), axis=0)
+    levels[:, 2] = 0
+    levels[first_delivery:, 2] = rng.integers(1, 50, size=n_rows - first_delivery)*1000
+    return pd.DataFrame(levels, columns=["Short", "Cases per 100k", "vaccine_allocations"])
+
+
+@pytest.mark.parametrize("lag, min_train, first_delivery", [(1, 30, 10), (2, 40, 70), (3, 50, 90)])
+def test_backtest_matches_refit_at_every_origin(lag, min_train, first_delivery):
+    data = _levels(110, first_delivery)
+    horizon = 5
+    horizons, mse_by_horizon, errors, origins = walk_forward_backtest(data, lag, min_train, horizon, "Short")
+
+    levels = data.to_numpy()
+    diff = np.diff(levels, axis=0)
+    np.testing.assert_array_equal(origins, np.arange(min_train, len(levels)))
+    expected = np.full(errors.shape, np.nan)
+    for i, origin in enumerate(origins):
+        # refit on every difference known at the origin
+        results = VAR(diff[:origin - 1]).fit(lag)
+        forecast = levels[origin - 1, 0] + np.cumsum(results.forecast(diff[origin - 1 - lag:origin - 1], horizon)[:, 0])
+        observed = levels[origin:origin + horizon, 0]
+        expected[i, :len(observed)] = forecast[:len(observed)] - observed
+    np.testing.assert_allclose(errors, expected, rtol=1e-7, atol=1e-9)
+    np.testing.assert_allclose(mse_by_horizon, np.nanmean(expected**2, axis=0), rtol=1e-8)
+    np.testing.assert_array_equal(horizons, np.arange(1, horizon + 1))
@@ -0,0 +1,37 @@
+import os
+import json
+
+import pytest
+
+from covid_benchmark import run_benchmark
+from covid_data_loader import TRIPS_FILE
+
+
+@pytest.fixture
+def source_options():
+    return {"n_states": 2, "counties_per_state": 3, "start_date": "2020-02-01", "end_date": "2021-05-10"}
+
+
+def test_run_benchmark_reports_every_stage(data_dir):
+    output = data_dir / "report" / "report.json"
+    report = run_benchmark(str(data_dir), output=str(output), scale="tiny")
+    assert json.loads(output.read_text()) == json.loads(json.dumps(report))
+    assert report["scale"] == "tiny"
+    assert report["generation"]["counties_per_state"] == 3
+    assert report["rows"][TRIPS_FILE] == 2*4*465
+
+    stages = {(entry["function"], entry["call"], entry["stage"]): entry for entry in report["stages"]}
+    names = {stage for _, _, stage in stages}
+    assert {"csv parse", "cache write", "cache load", "index build", "index load", "masking", "date conversion",
+            "target computation", "feature computation", "allocation join", "concat", "streaming scan",
+            "total", "other"} <= names
+    for function_name in ["county_extraction", "state_extraction", "county_panel", "region_data",
+                          "vaccine_allocations", "first_dose", "second_dose", "cumul_doses", "allocation_panel"]:
+        for call in ["first", "repeat"]:
+            total = stages[(function_name, call, "total")]
+            assert total["rows"] > 0
+            assert total["seconds"] > 0
+            assert total["rows_per_second"] == pytest.approx(total["rows"]/total["seconds"])
+            assert total["peak_alloc_bytes"] > 0
+            if hasattr(os, "fork"):
+                assert total["peak_rss_bytes"] >= total["start_rss_bytes"] > 0
@@ -0,0 +1,160 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import covid_data_loader
+from covid_data_loader import read_trips, TRIPS_FILE, TRIP_COLUMNS
+
+
+@pytest.fixture
+def source_options():
+    return {"n_states": 3, "counties_per_state": 4, "start_date": "2020-01-01", "end_date": "2020-03-31"}
+
+
+@pytest.fixture
+def data_dir(data_dir, monkeypatch):
+    # many chunks, so the codes are renumbered across chunks
+    monkeypatch.setattr(covid_data_loader, "CHUNK_SIZE", 97)
+    return data_dir
+
+
+def _pandas_trips(data_dir, state_code, county_name, start_date, end_date):
+    trips = pd.read_csv(data_dir / TRIPS_FILE)
+    dates = pd.to_datetime(trips["Date"])
+    mask = np.array(trips["State Postal Code"].isin([state_code] if isinstance(state_code, str) else state_code))
+    if county_name is None:
+        mask &= np.array(trips["County Name"].isnull())
+    elif isinstance(county_name, str) and county_name == "all":
+        mask &= np.array(trips["County Name"].notnull())
+    else:
+        mask &= np.array(trips["County Name"].isin([county_name] if isinstance(county_name, str) else county_name))
+    if start_date is not None:
+        mask &= np.array(dates >= start_date)
+    if end_date is not None:
+        mask &= np.array(dates <= end_date)
+    travel = trips.loc[mask, TRIP_COLUMNS].assign(Date=dates[mask].astype("datetime64[ns]"))
+    travel = travel.sort_values(["State Postal Code", "County Name", "Date"], kind="mergesort", na_position="first")
+    return travel.reset_index(drop=True)
+
+
+@pytest.mark.parametrize("state_code, county_name, start_date, end_date", [
+    ("GA", "Fulton County", "2020-02-01", "2020-02-29"),
+    ("GA", ["Cobb County", "Fulton County", "Lowndes County"], "2020-02-01", "2020-02-29"),
+    ("GA", "all", "2020-03-01", "2020-03-07"),
+    (["AL", "GA"], "all", None, None),
+    ("GA", None, "2020-02-01", "2020-02-29"),
+    (["AK", "GA"], None, None, "2020-01-15"),
+    ("AL", "Alabama 002 County", "2020-03-15", None),
+    ("AL", "Alabama 002 County", None, None),
+    (["AL", "GA"], ["Alabama 001 County", "Fulton County"], "2020-01-10", "2020-01-20"),
+    ("ZZ", "Fulton County", None, None),
+    ("GA", "Nowhere County", None, None),
+    ("GA", "Fulton County", "2021-01-01", None)])
+def test_index_matches_streaming_and_pandas(data_dir, state_code, county_name, start_date, end_date):
+    indexed = read_trips(state_code, county_name, start_date, end_date)
+    streamed = read_trips(state_code, county_name, start_date, end_date, streaming=True)
+    expected = _pandas_trips(data_dir, state_code, county_name, start_date, end_date)
+
+    pd.testing.assert_frame_equal(indexed, streamed)
+    pd.testing.assert_frame_equal(indexed, expected, check_dtype=False)
+
+
+def test_index_keys_are_sorted_groups(data_dir):
+    index = covid_data_loader.trip_index()
+    assert list(index.state_codes) == ["AK", "AL", "GA"]
+    assert np.all(np.diff(index.keys) > 0)
+    # county code 0 marks the state rows, one per state and day
+    state_rows = index.columns["County Name"] == 0
+    assert state_rows.sum() == 3*91
+    bounds = covid_data_loader.index_slices(index, "GA", "all")
+    assert len(bounds) == 4
+    assert (bounds[:, 1] - bounds[:, 0] == 91).all()
+
+
+def test_index_store_round_trips_counts(data_dir, monkeypatch):
+    trips = pd.read_csv(data_dir / TRIPS_FILE)
+    # a float count column with NaN and a value float32 cannot hold, and an
+    # integer column that only turns float in one chunk in the middle
+    trips["Number of Trips <1"] = trips["Number of Trips <1"].astype(float)
+    trips.loc[::7, "Number of Trips <1"] = np.nan
+    trips.loc[5, "Number of Trips <1"] = 2.0**40 + 0.5
+    trips["Number of Trips 1-3"] = trips["Number of Trips 1-3"].astype(object)
+    trips.loc[[600, 601, 602], "Number of Trips 1-3"] = [np.nan, 1.25, np.nan]
+    trips.to_csv(data_dir / TRIPS_FILE, index=False)
+
+    built = read_trips(["AK", "AL", "GA"], "all")
+    covid_data_loader.clear_cache()
+    monkeypatch.setattr(covid_data_loader, "_build_trip_index", None)
+    for county_name in ["all", None]:
+        loaded = read_trips(["AK", "AL", "GA"], county_name)
+        expected = _pandas_trips(data_dir, ["AK", "AL", "GA"], county_name, None, None)
+        pd.testing.assert_frame_equal(loaded, expected, check_dtype=False, check_exact=True)
+        assert (loaded.dtypes[TRIP_COLUMNS[3:]] == expected.dtypes[TRIP_COLUMNS[3:]]).all()
+    pd.testing.assert_frame_equal(read_trips(["AK", "AL", "GA"], "all"), built)
+    assert loaded["Number of Trips 1-3"].dtype == np.float64
+
+
+def test_index_store_invalidation(data_dir, monkeypatch):
+    source = data_dir / TRIPS_FILE
+    covid_data_loader.trip_index()
+    builds = []
+    build = covid_data_loader._build_trip_index
+    monkeypatch.setattr(covid_data_loader, "_build_trip_index", lambda path: builds.append(path) or build(path))
+
+    # touched but unchanged: the store is kept
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    covid_data_loader.clear_cache()
+    covid_data_loader.trip_index()
+    assert builds == []
+
+    # changed with the same size: the hash differs and the store is rebuilt
+    trips = pd.read_csv(source)
+    fulton = trips.index[trips["County Name"] == "Fulton County"][0]
+    population = trips.loc[fulton, "Population Staying at Home"]
+    trips.loc[fulton, "Population Staying at Home"] = population + 1 if population % 10 != 9 else population - 1
+    trips.to_csv(source, index=False)
+    assert os.stat(source).st_size == stat.st_size
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2*10**9))
+    covid_data_loader.clear_cache()
+    travel = read_trips("GA", "Fulton County")
+    assert len(builds) == 1
+    assert travel["Population Staying at Home"].iloc[0] == trips.loc[fulton, "Population Staying at Home"]
+
+
+def test_column_cache_round_trips_and_invalidates(data_dir, monkeypatch):
+    source = data_dir / "columns.csv"
+    pd.DataFrame({"text": ["a", None, "b", "a", None], "flag": [True, False, True, True, False],
+                  "flag_missing": [True, None, False, True, True], "count": [1, 2, 3, 4, 5],
+                  "value": [0.5, np.nan, 2.0**40 + 0.5, -1.0, 3.25]}).to_csv(source, index=False)
+    parses = []
+    store = covid_data_loader._store_columns
+    monkeypatch.setattr(covid_data_loader, "_store_columns", lambda *args: parses.append(args[0]) or store(*args))
+
+    expected = pd.read_csv(source)
+    cold = covid_data_loader.read_source("columns.csv")
+    covid_data_loader.clear_cache()
+    warm = covid_data_loader.read_source("columns.csv")
+    assert len(parses) == 1
+    assert expected["flag"].dtype == bool
+    pd.testing.assert_frame_equal(cold, expected, check_exact=True)
+    pd.testing.assert_frame_equal(warm, expected, check_exact=True)
+
+    # touched but unchanged: the columns are kept
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    covid_data_loader.clear_cache()
+    pd.testing.assert_frame_equal(covid_data_loader.read_source("columns.csv"), expected, check_exact=True)
+    assert len(parses) == 1
+
+    # changed with the same size: the hash differs and the columns are rebuilt
+    source.write_text(source.read_text().replace("a,True", "c,True"))
+    assert os.stat(source).st_size == stat.st_size
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2*10**9))
+    covid_data_loader.clear_cache()
+    changed = covid_data_loader.read_source("columns.csv")
+    assert len(parses) == 2
+    pd.testing.assert_frame_equal(changed, pd.read_csv(source), check_exact=True)
+    assert changed["text"].iloc[0] == "c"
@@ -0,0 +1,92 @@
+import os
+import sys
+import importlib
+
+import numpy as np
+import pytest
+
+from covid_experiments import run_grid, lasso_model, MODEL_FEATURES
+from covid_feature_extraction import region_data
+from covid_model_selection import lasso_path_cv
+
+MODELS_SOURCE = '''
+def mean_model(data, target_label, shift=0.0):
+    return data[target_label].mean() + shift
+
+
+def last_model(data, target_label):
+    return data[target_label].iloc[-1]
+'''
+
+
+@pytest.fixture
+def source_options():
+    return {"counties_per_state": 3, "start_date": "2020-02-01", "end_date": "2021-04-30"}
+
+
+@pytest.fixture
+def grid_models(tmp_path, monkeypatch):
+    # the models live in a module of their own, so their source can change
+    module_dir = tmp_path / "grid_models"
+    module_dir.mkdir()
+    (module_dir / "grid_models.py").write_text(MODELS_SOURCE)
+    monkeypatch.syspath_prepend(str(module_dir))
+    yield module_dir / "grid_models.py", importlib.import_module("grid_models")
+    sys.modules.pop("grid_models", None)
+
+
+def _cache_files(cache_dir):
+    return {name: os.stat(os.path.join(cache_dir, name)).st_mtime_ns for name in os.listdir(cache_dir)}
+
+
+def test_rerun_recomputes_only_changed_models(data_dir, grid_models):
+    module_path, module = grid_models
+    cache_dir = str(data_dir / "experiments")
+    grid = {"regions": ["Georgia", "Fulton"], "target_labels": ["Short", "Long"], "n_jobs": 2, "cache_dir": cache_dir}
+    models = {"mean": (module.mean_model, {}), "last": (module.last_model, {})}
+    results = run_grid(models=models, **grid)
+    assert len(results) == 8
+    cached = _cache_files(cache_dir)
+    assert len(cached) == 8
+
+    # nothing changed: every cell is loaded
+    assert run_grid(models=models, **grid) == results
+    assert _cache_files(cache_dir) == cached
+
+    # new params for one model: only its four cells run again
+    models["mean"] = (module.mean_model, {"shift": 1.0})
+    shifted = run_grid(models=models, **grid)
+    after_params = _cache_files(cache_dir)
+    assert len(set(after_params) - set(cached)) == 4
+    for cell, value in results.items():
+        expected = value + 1.0 if cell[2] == "mean" else value
+        np.testing.assert_allclose(shifted[cell], expected)
+
+    # new source for the other model: only its four cells run again
+    module_path.write_text(MODELS_SOURCE.replace("iloc[-1]", "iloc[0]"))
+    stat = os.stat(module_path)
+    os.utime(module_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    module = importlib.reload(module)
+    models = {"mean": (module.mean_model, {"shift": 1.0}), "last": (module.last_model, {})}
+    edited = run_grid(models=models, **grid)
+    after_source = _cache_files(cache_dir)
+    assert len(set(after_source) - set(after_params)) == 4
+    for cell, value in shifted.items():
+        if cell[2] == "last":
+            assert edited[cell] != value
+        else:
+            assert edited[cell] == value
+    assert all(after_source[name] == mtime for name, mtime in after_params.items())
+
+
+def test_lasso_model_standardizes_features(data_dir):
+    data = region_data("Fulton", "Short")
+    result = lasso_model(data, "Short")
+    X = data[MODEL_FEATURES].to_numpy()
+    np.testing.assert_allclose(result["feature_mean"], X.mean(axis=0))
+    np.testing.assert_allclose(result["feature_scale"], X.std(axis=0))
+
+    coefs, scores, best_lambda, _ = lasso_path_cv((X - X.mean(axis=0))/X.std(axis=0), data["Short"], n_jobs=1)
+    np.testing.assert_allclose(result["scores"], scores)
+    np.testing.assert_allclose(result["coefs"], coefs)
+    assert result["best_lambda"] == best_lambda
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from covid_benchmark import OTHER_JURISDICTIONS
+from covid_data_loader import (read_source, read_trips, TRIPS_FILE, EPICURVE_FILE, PFIZER_FILE, MODERNA_FILE,
+                               JANSSEN_FILE)
+from covid_feature_extraction import (county_extraction, county_panel, region_data, first_dose, second_dose,
+                                      cumul_doses, vaccine_allocations, allocation_panel, STATE_CODES, TARGET_LABELS,
+                                      FEATURE_LABELS)
+
+
+@pytest.fixture
+def source_options():
+    return {"n_states": 3, "counties_per_state": 4, "start_date": "2020-02-01", "end_date": "2021-05-10"}
+
+
+@pytest.mark.parametrize("county_names", ["all", ["Lowndes", "Fulton", "Cobb"]])
+def test_county_panel_matches_county_extraction(data_dir, county_names):
+    panel_dates, counties, panel_y, panel_X, feature_labels, populations = county_panel(
+        county_names, start_date="2020-02-29", end_date="2020-05-31")
+    assert counties == (["Chatham", "Cobb", "Fulton", "Lowndes"] if county_names == "all" else county_names)
+    for c, county_name in enumerate(counties):
+        for k, target_label in enumerate(TARGET_LABELS):
+            dates, y, X, labels = county_extraction(county_name, target_label, "2020-02-29", "2020-05-31")
+            np.testing.assert_array_equal(panel_dates, pd.DatetimeIndex(dates))
+            np.testing.assert_allclose(panel_y[c, :, k], y)
+            np.testing.assert_allclose(panel_X[c], X.to_numpy(dtype=float))
+        assert feature_labels == labels
+
+
+def test_county_panel_rejects_duplicate_counties(data_dir):
+    with pytest.raises(ValueError, match="Fulton"):
+        county_panel(["Fulton", "Cobb", "Fulton"])
+
+
+@pytest.mark.parametrize("region, county_name", [("Fulton", "Fulton County"), ("Georgia", None)])
+def test_region_data_joins_features_on_dates(data_dir, region, county_name):
+    # one trips day and a different epicurve day of the region go missing
+    trips = pd.read_csv(data_dir / TRIPS_FILE)
+    county_rows = trips["County Name"].isnull() if county_name is None else trips["County Name"] == county_name
+    missing_trips = np.logical_and(county_rows, trips["Date"] == "2020/12/14")
+    trips.loc[~missing_trips].to_csv(data_dir / TRIPS_FILE, index=False)
+    epicurve = pd.read_csv(data_dir / EPICURVE_FILE)
+    missing_cases = np.logical_and(epicurve["county"] == region, epicurve["report_date"] == "2020-06-01")
+    epicurve.loc[~missing_cases].to_csv(data_dir / EPICURVE_FILE, index=False)
+
+    data = region_data(region, "Short")
+    days = pd.date_range("2020-02-29", "2021-04-10")
+    assert list(data.index) == [day for day in days if day != pd.Timestamp("2020-12-14")]
+    assert data.loc["2020-06-01", FEATURE_LABELS].isnull().all()
+
+    # every other row holds that report date's cases per 100k residents
+    travel = read_trips("GA", county_name, "2020-02-29", "2020-02-29")
+    population = (travel["Population Staying at Home"] + travel["Population Not Staying at Home"]).iloc[0]
+    cases = epicurve.loc[epicurve["county"] == region]
+    cases.index = pd.to_datetime(cases["report_date"])
+    present = data.index[data.index != pd.Timestamp("2020-06-01")]
+    np.testing.assert_allclose(data.loc[present, "Cases per 100k"], 1e5*cases.loc[present, "total_cases"]/population)
+    np.testing.assert_allclose(data.loc[present, "Cumulative Deaths per 100k"], 1e5*cases.loc[present, "death_cum"]/population)
+
+    # a county keeps the state's allocations of its missing day in the total
+    _, _, doses = cumul_doses("Georgia", "GA", "Short", "2020-02-29", "2021-04-10")
+    assert data["cumulative_allocations"].iloc[-1] == doses.iloc[-1]
+    if county_name is not None:
+        assert data["vaccine_allocations"].sum() < doses.iloc[-1]
+
+
+def _loop_doses(state_name, state_code, dose_labels):
+    # the per-day loop of the original first_dose, second_dose and cumul_doses
+    state_travel = read_trips(state_code, None, "2020-12-01", "2021-04-26")
+    all_dates_str = [date.strftime("%m/%d/%Y") for date in pd.to_datetime(state_travel["Date"])]
+    rows = []
+    for date_str in all_dates_str:
+        num_allocations = 0
+        for file_name, labels in dose_labels.items():
+            source = read_source(file_name)
+            state_source = source.loc[source["Jurisdiction"] == state_name].reset_index(drop=True)
+            if date_str in list(state_source["Week of Allocations"]):
+                for label in labels:
+                    num_allocations += int(state_source[state_source["Week of Allocations"] == date_str][label].iloc[0])
+        rows.append({"Week of Allocations": date_str, "Doses": num_allocations})
+    state_doses = pd.DataFrame(rows)
+    return pd.to_datetime(state_doses["Week of Allocations"]), state_doses["Doses"]
+
+
+@pytest.mark.parametrize("state_name, state_code", [("Georgia", "GA"), ("Alabama", "AL")])
+def test_dose_functions_match_per_day_loop(data_dir, state_name, state_code):
+    first = {PFIZER_FILE: ["1st Dose Allocations"], MODERNA_FILE: ["1st Dose Allocations"],
+             JANSSEN_FILE: ["1st Dose Allocations"]}
+    second = {PFIZER_FILE: ["2nd Dose Allocations"], MODERNA_FILE: ["2nd Dose Allocations"]}
+    total = {PFIZER_FILE: ["1st Dose Allocations", "2nd Dose Allocations"],
+             MODERNA_FILE: ["1st Dose Allocations", "2nd Dose Allocations"],
+             JANSSEN_FILE: ["1st Dose Allocations"]}
+    for function, dose_labels, name, cumulative in [(first_dose, first, "1st Dose Allocations", False),
+                                                    (second_dose, second, "2nd Dose Allocations", False),
+                                                    (cumul_doses, total, "Total Doses", True)]:
+        dates, y, doses = function(state_name, state_code, "Short")
+        expected_dates, expected_doses = _loop_doses(state_name, state_code, dose_labels)
+        if cumulative:
+            expected_doses = expected_doses.cumsum()
+        assert expected_doses.iloc[-1] > 0
+        pd.testing.assert_series_equal(dates, expected_dates, check_dtype=False)
+        pd.testing.assert_series_equal(doses, expected_doses.rename(name), check_dtype=False)
+        assert len(y) == len(dates)
+
+
+def test_allocation_panel_matches_vaccine_allocations(data_dir):
+    panel_dates, jurisdictions, codes, panel_y, panel_doses, populations = allocation_panel()
+    assert set(OTHER_JURISDICTIONS) < set(jurisdictions)
+    assert len(jurisdictions) == 3 + len(OTHER_JURISDICTIONS)
+    assert codes == [STATE_CODES.get(name) for name in jurisdictions]
+
+    for state_name in ["Georgia", "Alabama"]:
+        j = jurisdictions.index(state_name)
+        for k, target_label in enumerate(TARGET_LABELS):
+            dates, y, doses = vaccine_allocations(state_name, STATE_CODES[state_name], target_label)
+            np.testing.assert_array_equal(panel_dates, pd.DatetimeIndex(dates))
+            np.testing.assert_allclose(panel_y[j, :, k], y)
+        np.testing.assert_array_equal(panel_doses[j, :, :, 0].sum(axis=1), doses["1st Dose Allocations"])
+        np.testing.assert_array_equal(panel_doses[j, :, :, 1].sum(axis=1), doses["2nd Dose Allocations"])
+        travel = read_trips(STATE_CODES[state_name], None, "2020-12-01", "2020-12-01")
+        assert populations[j] == (travel["Population Staying at Home"] + travel["Population Not Staying at Home"]).iloc[0]
+
+    # cities and territories have doses but no trips
+    for name in OTHER_JURISDICTIONS:
+        j = jurisdictions.index(name)
+        assert codes[j] is None
+        assert np.isnan(panel_y[j]).all()
+        assert np.isnan(populations[j])
+        assert panel_doses[j].sum() > 0
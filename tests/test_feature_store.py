@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import covid_feature_store
+from covid_data_loader import TRIPS_FILE, EPICURVE_FILE
+from covid_feature_extraction import county_extraction, FEATURE_LABELS
+
+
+@pytest.fixture
+def source_options():
+    return {"counties_per_state": 3, "start_date": "2020-01-01", "end_date": "2020-04-30"}
+
+
+@pytest.fixture
+def data_dir(data_dir):
+    # reported moving averages from pandas rather than the generator, so the
+    # store is checked against an independent 7-day mean
+    epicurve = pd.read_csv(data_dir / EPICURVE_FILE)
+    for daily, average in [("total_cases", "moving_avg_total_cases"), ("deaths", "moving_avg_deaths")]:
+        epicurve[average] = epicurve.groupby("county")[daily].transform(lambda values: values.rolling(7).mean())
+    epicurve.to_csv(data_dir / EPICURVE_FILE, index=False)
+    return data_dir
+
+
+def test_daily_refresh_matches_one_shot(data_dir):
+    for day in pd.date_range("2020-02-29", "2020-03-20"):
+        covid_feature_store.refresh_features("Fulton", day, store_dir=str(data_dir / "daily"))
+    covid_feature_store.refresh_features("Fulton", "2020-03-20", store_dir=str(data_dir / "once"))
+
+    daily = covid_feature_store.load_features("Fulton", store_dir=str(data_dir / "daily"))
+    once = covid_feature_store.load_features("Fulton", store_dir=str(data_dir / "once"))
+    assert len(daily) == 21
+    pd.testing.assert_frame_equal(daily, once)
+
+
+def test_store_matches_county_extraction(data_dir):
+    covid_feature_store.refresh_features("Fulton", "2020-03-20", store_dir=str(data_dir / "store"))
+    features = covid_feature_store.load_features("Fulton", store_dir=str(data_dir / "store"))
+    dates, y, X, _ = county_extraction("Fulton", "Short", "2020-02-29", "2020-03-20")
+
+    np.testing.assert_array_equal(features["Date"], pd.DatetimeIndex(dates).normalize())
+    np.testing.assert_allclose(features["Short"], y)
+    np.testing.assert_allclose(features[FEATURE_LABELS].to_numpy(), X.to_numpy(dtype=float))
+
+
+def test_trips_gap_keeps_running_totals(data_dir):
+    trips = pd.read_csv(data_dir / TRIPS_FILE)
+    missing = np.logical_and(trips["County Name"] == "Fulton County", trips["Date"] == "2020/03/10")
+    trips.loc[~missing].to_csv(data_dir / TRIPS_FILE, index=False)
+
+    for day in pd.date_range("2020-02-29", "2020-03-20"):
+        covid_feature_store.refresh_features("Fulton", day, store_dir=str(data_dir / "daily"))
+    covid_feature_store.refresh_features("Fulton", "2020-03-20", store_dir=str(data_dir / "once"))
+    daily = covid_feature_store.load_features("Fulton", store_dir=str(data_dir / "daily"))
+    once = covid_feature_store.load_features("Fulton", store_dir=str(data_dir / "once"))
+    pd.testing.assert_frame_equal(daily, once)
+
+    # every case day still counts, only the row of the missing day is gone
+    dates, y, X, _ = county_extraction("Fulton", "Short", "2020-02-29", "2020-03-20")
+    X.index = pd.date_range("2020-02-29", "2020-03-20")
+    assert pd.Timestamp("2020-03-10") not in set(once["Date"])
+    np.testing.assert_array_equal(once["Date"], pd.DatetimeIndex(dates).normalize())
+    np.testing.assert_allclose(once["Short"], y)
+    np.testing.assert_allclose(once[FEATURE_LABELS].to_numpy(), X.loc[once["Date"]].to_numpy(dtype=float))
+
+
+def _append_days(data_dir, file_name, frame, dates, date_column, date_format):
+    rows = frame.loc[frame[date_column].isin([day.strftime(date_format) for day in dates])]
+    rows.to_csv(data_dir / file_name, mode="a", header=False, index=False)
+
+
+def test_refresh_parses_only_appended_rows(data_dir, monkeypatch):
+    trips = pd.read_csv(data_dir / TRIPS_FILE)
+    epicurve = pd.read_csv(data_dir / EPICURVE_FILE)
+    trips.loc[trips["Date"] <= "2020/03/09"].to_csv(data_dir / TRIPS_FILE, index=False)
+    epicurve.loc[epicurve["report_date"] <= "2020-03-10"].to_csv(data_dir / EPICURVE_FILE, index=False)
+    covid_feature_store.refresh_features("Fulton", store_dir=str(data_dir / "daily"))
+
+    # from now on neither source may be read in full
+    def full_read(*args, **kwargs):
+        raise AssertionError("a source was read in full")
+    readers = {name: getattr(covid_feature_store, name) for name in ["read_trips", "read_source"]}
+    for name in readers:
+        monkeypatch.setattr(covid_feature_store, name, full_read)
+    # each day's case report arrives a day before its trips
+    for day in pd.date_range("2020-03-11", "2020-03-20"):
+        _append_days(data_dir, EPICURVE_FILE, epicurve, [day], "report_date", "%Y-%m-%d")
+        _append_days(data_dir, TRIPS_FILE, trips, [day - pd.Timedelta(days=1)], "Date", "%Y/%m/%d")
+        appended = covid_feature_store.refresh_features("Fulton", store_dir=str(data_dir / "daily"))
+        assert list(appended["Date"]) == [day - pd.Timedelta(days=1)]
+    _append_days(data_dir, TRIPS_FILE, trips, [pd.Timestamp("2020-03-20")], "Date", "%Y/%m/%d")
+    # a refresh bounded by end_date keeps the later rows for the next one
+    with open(data_dir / TRIPS_FILE, "a") as trips_file:
+        trips_file.write("County,2020/03/21,13,GA")
+    assert len(covid_feature_store.refresh_features("Fulton", "2020-03-19", store_dir=str(data_dir / "daily"))) == 0
+    assert len(covid_feature_store.refresh_features("Fulton", store_dir=str(data_dir / "daily"))) == 1
+    for name, reader in readers.items():
+        monkeypatch.setattr(covid_feature_store, name, reader)
+
+    covid_feature_store.refresh_features("Fulton", "2020-03-20", store_dir=str(data_dir / "once"))
+    daily = covid_feature_store.load_features("Fulton", store_dir=str(data_dir / "daily"))
+    once = covid_feature_store.load_features("Fulton", store_dir=str(data_dir / "once"))
+    assert daily["Date"].iloc[-1] == pd.Timestamp("2020-03-20")
+    pd.testing.assert_frame_equal(daily, once)
+
+
+def test_refresh_rereads_rewritten_sources(data_dir):
+    covid_feature_store.refresh_features("Fulton", "2020-03-10", store_dir=str(data_dir / "daily"))
+    # a republished epicurve, e.g. with its rows in another order
+    epicurve = pd.read_csv(data_dir / EPICURVE_FILE)
+    epicurve.iloc[::-1].to_csv(data_dir / EPICURVE_FILE, index=False)
+    covid_feature_store.refresh_features("Fulton", "2020-03-20", store_dir=str(data_dir / "daily"))
+    covid_feature_store.refresh_features("Fulton", "2020-03-20", store_dir=str(data_dir / "once"))
+    pd.testing.assert_frame_equal(covid_feature_store.load_features("Fulton", store_dir=str(data_dir / "daily")),
+                                  covid_feature_store.load_features("Fulton", store_dir=str(data_dir / "once")))
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import Lasso
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import KFold
+from statsmodels.tsa.api import VAR
+
+from covid_model_selection import lasso_path_cv, var_lag_sweep
+
+
+def _var_levels(n_rows, seed=0):
+    # levels of a stable VAR(2) in the differences, one series in another's scale
+    rng = np.random.default_rng(seed)
+    A1 = np.array([[0.4, 0.1, 0.0], [-0.2, 0.3, 0.1], [0.1, 0.0, 0.2]])
+    A2 = np.array([[0.1, 0.0, -0.1], [0.0, 0.1, 0.0], [0.05, 0.1, 0.1]])
+    diff = np.zeros((n_rows, 3))
+    for t in range(2, n_rows):
+        diff[t] = 0.1 + A1 @ diff[t - 1] + A2 @ diff[t - 2] + rng.normal(size=3)
+    return np.cumsum(diff*[1, 10, 0.1], axis=0)
+
+
+@pytest.mark.parametrize("max_lag", [1, 4, 7])
+def test_var_lag_sweep_matches_statsmodels(max_lag):
+    levels = _var_levels(160)
+    lags, aic_vals, mse_vals = var_lag_sweep(levels, max_lag=max_lag, target=1)
+
+    train = levels[:int(0.85*len(levels))]
+    test = levels[int(0.85*len(levels)):]
+    diff = np.diff(train, axis=0)
+    np.testing.assert_array_equal(lags, np.arange(1, max_lag + 1))
+    for p in lags:
+        results = VAR(diff).fit(p)
+        forecast = train[-1, 1] + np.cumsum(results.forecast(diff[-p:], len(test))[:, 1])
+        np.testing.assert_allclose(aic_vals[p - 1], results.aic, rtol=1e-10)
+        np.testing.assert_allclose(mse_vals[p - 1], ((forecast - test[:, 1])**2).mean(), rtol=1e-8)
+
+
+def test_lasso_path_cv_matches_per_fold_lasso():
+    # standardized features, so coordinate descent converges for every lambda
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(120, 6))
+    X = (X - X.mean(axis=0))/X.std(axis=0)
+    y = X @ [1.5, -0.8, 0.0, 0.0, 0.3, 0.0] + 2.0 + rng.normal(scale=1.5, size=120)
+    lambdas = np.logspace(-3, 0, 40)
+    coefs, scores, best_lambda, best_index = lasso_path_cv(X, y, lambdas=lambdas)
+
+    # the per-(lambda, fold) loop of lasso_coefs in Lasso_Combined.ipynb
+    expected_coefs, expected_scores = [], []
+    for alpha in lambdas:
+        fold_coefs, fold_scores = [], []
+        for train_indices, test_indices in KFold(n_splits=5).split(X):
+            lasso = Lasso(alpha=alpha, max_iter=10000).fit(X[train_indices], y[train_indices])
+            fold_coefs.append(lasso.coef_)
+            fold_scores.append(mean_squared_error(y[test_indices], lasso.predict(X[test_indices])))
+        expected_coefs.append(np.mean(fold_coefs, axis=0))
+        expected_scores.append(np.mean(fold_scores))
+    expected_index = max(i for i, score in enumerate(expected_scores) if score <= min(expected_scores))
+
+    # both stop within the solver's default tol of the optimum
+    np.testing.assert_allclose(coefs, expected_coefs, atol=1e-4)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+    assert 0 < best_index < len(lambdas) - 1
+    assert best_index == expected_index
+    assert best_lambda == lambdas[expected_index]
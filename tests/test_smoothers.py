@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from scipy.interpolate import RBFInterpolator
+
+import covid_smoothers
+from covid_smoothers import fit_rbf, predict_rbf, local_rbf, panel_rows, rbf_smoothing_sweep, KERNELS
+
+
+@pytest.mark.parametrize("kernel", ["multiquadric", "gaussian"])
+def test_sweep_matches_fit_rbf_per_fold(kernel, monkeypatch):
+    # a trend in the first feature, so the held-out folds reach past the
+    # training maxima, and chunks that split the folds
+    monkeypatch.setattr(covid_smoothers, "CHUNK_SIZE", 37)
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 1, size=(250, 3))
+    X[:, 0] = np.linspace(0, 5, 250)
+    y = np.sin(X[:, 0]) + X[:, 1]*X[:, 2] + rng.normal(scale=0.1, size=250)
+    smoothings = np.logspace(-3, 1, 9)
+    scores, best_smoothing = rbf_smoothing_sweep(X, y, smoothings, n_splits=5, n_centers=40, epsilon=0.5,
+                                                 kernel=kernel, seed=3)
+
+    # an explicit solve on each fold's training rows, which also draws the
+    # same centres and scaling from them
+    expected = np.zeros((5, len(smoothings)))
+    for fold, test_indices in enumerate(np.array_split(np.arange(250), 5)):
+        train = np.setdiff1d(np.arange(250), test_indices)
+        for k, smoothing in enumerate(smoothings):
+            model = fit_rbf(X[train], y[train], n_centers=40, epsilon=0.5, smoothing=smoothing, kernel=kernel, seed=3)
+            assert np.all(model["scale"] == np.abs(X[train]).max(axis=0))
+            expected[fold, k] = ((predict_rbf(model, X[test_indices]) - y[test_indices])**2).mean()
+    np.testing.assert_allclose(scores, expected.mean(axis=0), rtol=1e-6)
+    assert best_smoothing == smoothings[np.argmin(expected.mean(axis=0))]
+
+
+def test_panel_rows_drops_missing_values():
+    panel_X = np.arange(24, dtype=float).reshape(2, 4, 3)
+    panel_y = np.arange(8, dtype=float).reshape(2, 4)
+    panel_X[0, 1, 2] = np.nan
+    panel_y[1, 3] = np.nan
+    X, y = panel_rows(panel_X, panel_y)
+    np.testing.assert_array_equal(y, [0, 2, 3, 4, 5, 6])
+    np.testing.assert_array_equal(X, panel_X.reshape(8, 3)[[0, 2, 3, 4, 5, 6]])
+
+
+@pytest.mark.parametrize("kernel", ["multiquadric", "gaussian"])
+def test_local_rbf_uses_the_fit_rbf_kernels(kernel):
+    # with every row as a neighbour and no smoothing, a direct solve with
+    # KERNELS on r/epsilon plus the constant RBFInterpolator adds
+    rng = np.random.default_rng(1)
+    X = rng.uniform(-2, 4, size=(40, 2))
+    y = np.sin(X[:, 0]) + X[:, 1]**2
+    X_eval = rng.uniform(-2, 4, size=(15, 2))
+    y_pred = local_rbf(X, y, X_eval, neighbors=40, epsilon=0.7, interpolation_smoothing=0, kernel=kernel)
+
+    scale = np.abs(X).max(axis=0)
+    distances = lambda A, B: np.sqrt(((A[:, None, :] - B[None, :, :])**2).sum(axis=-1))
+    basis = lambda A: KERNELS[kernel](distances(A/scale, X/scale), 0.7)
+    system = np.block([[basis(X), np.ones((40, 1))], [np.ones((1, 40)), np.zeros((1, 1))]])
+    solution = np.linalg.solve(system, np.concatenate([y, [0]]))
+    np.testing.assert_allclose(y_pred, basis(X_eval) @ solution[:40] + solution[40], rtol=1e-5, atol=1e-6)
+
+    # the smoothing is RBFInterpolator's, on the same scaled features
+    interpolator = RBFInterpolator(X/scale, y, neighbors=8, smoothing=1e-3, kernel=kernel, epsilon=1/0.7)
+    np.testing.assert_allclose(local_rbf(X, y, X_eval, neighbors=8, epsilon=0.7, kernel=kernel),
+                               interpolator(X_eval/scale))